@@ -0,0 +1,32 @@
+# Dota2Collector, which polls Valve's API for Dota2HelperBot so that several instances of the bot can share one API key
+# Run it alongside bots that have "collector": true in data/settings.json
+
+import asyncio
+
+from cogs.utils.settings import load_settings
+from cogs.utils.collector import Collector
+
+settings = load_settings()
+
+if not settings["apikey"]:
+	print("No valid API key was found. Please make sure a Steam user API key is supplied in data/settings.json.")
+	raise SystemExit
+
+loop = asyncio.get_event_loop()
+collector = Collector(settings, loop)
+try:
+	loop.run_until_complete(collector.start())
+except OSError as err:
+	print("Unable to start the match feed: %s" % err)
+	raise SystemExit
+
+print("Dota2Collector is polling Valve's API. Match updates are sent from %s" % collector.get_address())
+if collector.log is not None:
+	print("Match updates are also appended to files in %s" % collector.log.directory)
+
+try:
+	loop.run_until_complete(collector.run())
+except KeyboardInterrupt:
+	pass
+finally:
+	loop.run_until_complete(collector.close())
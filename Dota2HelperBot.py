@@ -2,7 +2,14 @@
 
 import random
 import asyncio
+import functools
+import glob
 import json
+import os
+import signal
+import subprocess
+import sys
+import time
 
 try:
 	import discord
@@ -10,53 +17,27 @@ try:
 except ImportError:
 	print("Unable to start Dota2HelperBot. Check your discord.py installation.")
 
+from cogs.utils.dataIO import save_json
+from cogs.utils.metrics import Registry, MetricsServer
+from cogs.utils.settings import load_settings, SERVER_DEFAULTS
+from cogs.utils.collector import Collector
+from cogs.utils.sender import SendScheduler, COMMAND, NICKNAME
+
 DESC = "Dota2HelperBot, a Discord bot created by Blanedale"
-BOT_DEFAULTS = {
-	"token": "",
-	"prefix": ";",
-	"owner": "",
-	"changenick_interval": 3600,
-	"api_interval": 20,
-	"apikey": "",
-	"filter_matches": True,
-	"notable_leagues": [5401],
-	"filter_generic": True,
-	"no_repeat_matches": True,
-	"save_match_data": False,
-	"verbose": True
-}
-SERVER_DEFAULTS = {
-	"welcome_channel": "",
-	"matches_channel": "",
-	"welcome_messages": False,
-	"victory_messages": True,
-	"show_result": True,
-	"auto_change_nick": False
-}
+SERVER_SETTINGS_FILE = "data/server_settings.json"
+SHARD_SETTINGS_FILE = "data/server_settings_shard%s.json" # Each shard saves its servers' settings to its own file, so that shards do not overwrite each other's changes
+SHARD_CHECK_INTERVAL = 5 # Seconds between checks by the coordinator that its shards are still running
+SETTINGS_SAVE_DELAY = 5 # Changes to server settings made within this many seconds of each other are written to disk together
 CDMESSAGES = ["It is not time yet.", "'Tis not yet time.", "Not yet.",
 	"I need more time.", "I am not ready.", "It is not yet time."]
 
-settings = {}
-
-try:
-	with open("data/settings.json") as json_data:
-		file = json.load(json_data)
-		for key in BOT_DEFAULTS:
-			if key in file:
-				settings[key] = file[key]
-			else:
-				settings[key] = BOT_DEFAULTS[key]
-except FileNotFoundError:
-	print("You need to create a file named settings.json in the data folder (if there is none, create one). Please see the README for more information.")
-	raise SystemExit
-except json.decoder.JSONDecodeError:
-	print("Could not load settings.json. Please make sure the syntax is correct.")
+settings = load_settings()
 
 if not settings["token"]:
 	print("No valid token was found. Please make sure a Discord bot user token is supplied in data/settings.json.")
 	raise SystemExit
 
-if not settings["apikey"]:
+if not settings["apikey"] and not settings["collector"]:
 	print("No valid API key was found. Please make sure a Steam user API key is supplied in data/settings.json.")
 	raise SystemExit
 
@@ -71,14 +52,49 @@ class Bot(commands.Bot):
 		self.formatter = commands.formatter.HelpFormatter()
 		self.settings = {}
 		self.server_settings_list = {}
+		self.server_settings_file = SERVER_SETTINGS_FILE
 		self.nick = ""
+		self.server_settings_dirty = False
+		self._settings_save_handle = None
+		self._settings_save_lock = asyncio.Lock()
+		self.metrics = Registry()
+		self.metrics_server = None
+		self.command_seconds = self.metrics.histogram("command_seconds", "Time taken to handle each command")
+		self.command_errors = self.metrics.counter("command_errors_total", "Commands that ended in an error, by type of error")
+		self._command_started = {}
+		self._sender = None
 		# Maybe put the above code in this block, so the bot.settings = settings line is not needed? But I would need a way to change the prefix T.T
 
+	@property
+	def sender(self):
+		if self._sender is None:
+			self._sender = SendScheduler(self.loop, self.settings["send_concurrency"], self.metrics)
+		return self._sender
+
+	# Everything sent to Discord goes through the send scheduler, so that urgent messages are not stuck behind less important ones. Cogs say how urgent a message is with priority.
+
+	async def send_message(self, destination, content = None, *, priority = COMMAND, **kwargs):
+		server = getattr(destination, "server", None)
+		route = ("message", getattr(destination, "id", None)) # A missing destination is left for discord.py to complain about
+		return await self.sender.submit(priority, route, server.id if server else None, functools.partial(super().send_message, destination, content, **kwargs))
+
+	async def change_nickname(self, member, nickname, *, priority = NICKNAME):
+		route = ("nickname", member.server.id)
+		return await self.sender.submit(priority, route, member.server.id, functools.partial(super().change_nickname, member, nickname))
+
 	async def send_cmd_help(self, ctx):
 		pages = self.formatter.format_help_for(ctx, ctx.command)
 		for page in pages:
 			await self.send_message(ctx.message.channel, page)
 
+	def start_command_timer(self, ctx):
+		self._command_started[id(ctx)] = time.perf_counter()
+
+	def stop_command_timer(self, ctx):
+		started = self._command_started.pop(id(ctx), None)
+		if started is not None and ctx.command is not None:
+			self.command_seconds.observe(time.perf_counter() - started, command = ctx.command.qualified_name)
+
 	def is_owner(self, user):
 		return user.id == self.settings["owner"]
 
@@ -115,8 +131,42 @@ class Bot(commands.Bot):
 		return self.settings["api_interval"]
 	
 	def save_server_settings(self):
-		with open("data/server_settings.json", "w") as serv_set:
-			json.dump(self.server_settings_list, serv_set, indent = 4)
+		# Only schedules a save, so that a burst of changes (such as when joining many servers at once) results in a single write
+		self.server_settings_dirty = True
+		if self._settings_save_handle is None:
+			self._settings_save_handle = self.loop.call_later(SETTINGS_SAVE_DELAY, self._start_settings_save)
+
+	def _start_settings_save(self):
+		self._settings_save_handle = None
+		self.loop.create_task(self.write_server_settings())
+
+	def is_own_server(self, server_id):
+		# Discord assigns each server to a shard by its ID
+		return self.shard_id is None or (int(server_id) >> 22) % self.shard_count == self.shard_id
+
+	def _snapshot_server_settings(self):
+		# A shard only saves its own servers, although it also loads the others' from the shared file
+		self.server_settings_dirty = False
+		return {serv: dict(serv_settings) for serv, serv_settings in self.server_settings_list.items() if self.is_own_server(serv)}
+
+	async def write_server_settings(self):
+		async with self._settings_save_lock:
+			if not self.server_settings_dirty:
+				return
+			snapshot = self._snapshot_server_settings()
+			try:
+				await self.loop.run_in_executor(None, save_json, self.server_settings_file, snapshot)
+			except OSError as err:
+				print("Unable to save server settings: %s" % err)
+				self.save_server_settings() # Try again later
+
+	def flush_server_settings(self):
+		# Writes any pending changes immediately. Used on shutdown, when the event loop can no longer be relied on.
+		if self._settings_save_handle is not None:
+			self._settings_save_handle.cancel()
+			self._settings_save_handle = None
+		if self.server_settings_dirty:
+			save_json(self.server_settings_file, self._snapshot_server_settings())
 
 	def autogenerate_server_settings(self, server):
 		if server.id not in self.server_settings_list:
@@ -124,23 +174,31 @@ class Bot(commands.Bot):
 				print("Generating server-specific settings for %s..." % server.name)
 			self.server_settings_list[server.id] = dict(SERVER_DEFAULTS)
 			self.save_server_settings()
+			self.dispatch("server_settings_change", server)
 		else:
-			for setting, default in SERVER_DEFAULTS.items():
-				if setting not in self.server_settings_list[server.id]:
-					self.server_settings_list[server.id][setting] = default
-					self.save_server_settings()
+			missing = [setting for setting in SERVER_DEFAULTS if setting not in self.server_settings_list[server.id]]
+			for setting in missing:
+				self.server_settings_list[server.id][setting] = SERVER_DEFAULTS[setting]
+			if missing:
+				self.save_server_settings()
+				self.dispatch("server_settings_change", server)
+
+	# Cogs that keep track of server settings can listen for on_server_settings_change, which is dispatched by the setters below
 
 	def set_matches_channel(self, server, channel):
 		self.server_settings_list[server.id]["matches_channel"] = channel.id
 		self.save_server_settings()
+		self.dispatch("server_settings_change", server)
 
 	def set_victory_messages(self, server, option):
 		self.server_settings_list[server.id]["victory_messages"] = option
 		self.save_server_settings()
+		self.dispatch("server_settings_change", server)
 
 	def set_show_result(self, server, option):
 		self.server_settings_list[server.id]["show_result"] = option
 		self.save_server_settings()
+		self.dispatch("server_settings_change", server)
 
 	def add_notable_league(self, league):
 		self.settings["notable_leagues"].append(league)
@@ -148,19 +206,94 @@ class Bot(commands.Bot):
 	def remove_notable_league(self, league):
 		self.settings["notable_leagues"].remove(league)
 
-bot = Bot(command_prefix = settings["prefix"], description = DESC)
+# With shard_count greater than 1, running this file starts a coordinator, which polls Valve's API and runs each shard as a copy of this file with --shard and its number
+shard_id = None
+if "--shard" in sys.argv:
+	try:
+		shard_id = int(sys.argv[sys.argv.index("--shard") + 1])
+	except (IndexError, ValueError):
+		print("--shard must be followed by the number of the shard to run.")
+		raise SystemExit
+
+if shard_id is not None and not 0 <= shard_id < settings["shard_count"]:
+	print("There is no shard %s. Please check shard_count in data/settings.json." % shard_id)
+	raise SystemExit
+
+def start_shard(number):
+	return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--shard", str(number)])
+
+async def watch_shards(shards):
+	# Restarts any shard that has stopped, such as after a crash
+	while True:
+		await asyncio.sleep(SHARD_CHECK_INTERVAL)
+		for number, shard in enumerate(shards):
+			if shard.poll() is not None:
+				print("Shard %s stopped with exit code %s. Restarting it..." % (number, shard.returncode))
+				shards[number] = start_shard(number)
+
+def run_coordinator():
+	loop = asyncio.get_event_loop()
+	collector = None
+	if not settings["collector"]:
+		# Otherwise the shards follow a standalone collector, and all there is to do here is to look after them
+		collector = Collector(settings, loop)
+		try:
+			loop.run_until_complete(collector.start())
+		except OSError as err:
+			print("Unable to start the match feed for the shards: %s" % err)
+			raise SystemExit
+
+	shards = [start_shard(number) for number in range(settings["shard_count"])]
+	print("Started %s shards" % len(shards))
+	tasks = [watch_shards(shards)]
+	if collector is not None:
+		print("Match updates are sent to them from %s" % collector.get_address())
+		tasks.append(collector.run(len(shards)))
+	try:
+		loop.run_until_complete(asyncio.gather(*tasks))
+	except KeyboardInterrupt:
+		pass
+	finally:
+		for shard in shards:
+			shard.terminate()
+		for shard in shards:
+			shard.wait()
+		if collector is not None:
+			loop.run_until_complete(collector.close())
+
+if settings["shard_count"] > 1 and shard_id is None:
+	run_coordinator()
+	raise SystemExit
+
+if shard_id is not None and settings["metrics_port"]:
+	settings["metrics_port"] += shard_id + 1 # The coordinator serves its own metrics on metrics_port
+
+if shard_id is None:
+	bot = Bot(command_prefix = settings["prefix"], description = DESC)
+else:
+	bot = Bot(command_prefix = settings["prefix"], description = DESC, shard_id = shard_id, shard_count = settings["shard_count"])
+	bot.server_settings_file = SHARD_SETTINGS_FILE % shard_id
 bot.settings = settings
-bot.next_interval = bot.settings["api_interval"]
 
-try:
-	with open("data/server_settings.json") as json_data:
-		file = json.load(json_data)
-		for serv, serv_settings in file.items():
-			bot.server_settings_list[serv] = serv_settings
-except FileNotFoundError:
-	pass
-except json.decoder.JSONDecodeError:
-	print("Could not load server_settings.json. Please make sure the syntax is correct, or delete the file and restart the bot to generate a new one.")
+# Every file is read whether or not the bot is sharded, as a server's latest settings may be in any of them: Discord moves servers between shards when shard_count changes, and going back to a single process should not lose the changes made while sharded.
+# Each file only has the servers that were its writer's own, so the most recently written file is loaded last, and its settings take precedence.
+def get_modified_time(path):
+	try:
+		return os.path.getmtime(path)
+	except OSError:
+		return 0
+
+settings_files = sorted([SERVER_SETTINGS_FILE] + glob.glob(SHARD_SETTINGS_FILE % "*"), key = get_modified_time)
+for path in settings_files:
+	try:
+		with open(path) as json_data:
+			file = json.load(json_data)
+			for serv, serv_settings in file.items():
+				bot.server_settings_list[serv] = serv_settings
+	except FileNotFoundError:
+		pass
+	except json.decoder.JSONDecodeError:
+		print("Could not load %s. Please make sure the syntax is correct, or delete the file and restart the bot to generate a new one." % path)
 
 @bot.event
 async def on_ready():
@@ -182,6 +315,9 @@ async def on_ready():
 	print()
 	print("Dota 2 Helper Bot, a Discord bot created by Blanedale")
 	print()
+	if bot.shard_id is not None:
+		print("Running as shard %s of %s" % (bot.shard_id, bot.shard_count))
+		print()
 	print("Connected to the following servers:")
 	for server in bot.servers:
 		print(server.name)
@@ -189,14 +325,34 @@ async def on_ready():
 	print("To add this bot to a server, go to: %s" % bot.joinurl)
 	print()
 
+	if bot.settings["metrics_port"] and bot.metrics_server is None:
+		bot.metrics_server = MetricsServer(bot.metrics, bot.settings["metrics_host"], bot.settings["metrics_port"])
+		try:
+			await bot.metrics_server.start()
+			print("Serving metrics at http://%s:%s/" % (bot.settings["metrics_host"], bot.settings["metrics_port"]))
+			print()
+		except OSError as err:
+			print("Unable to serve metrics: %s" % err)
+			print()
+
 	await bot.change_presence(game = discord.Game(name = "%smatchchannel to set channel for match updates" % bot.settings["prefix"]))
 
 @bot.event
 async def on_server_join(server):
 	bot.autogenerate_server_settings(server)
 
+@bot.event
+async def on_command(command, ctx):
+	bot.start_command_timer(ctx)
+
+@bot.event
+async def on_command_completion(command, ctx):
+	bot.stop_command_timer(ctx)
+
 @bot.event
 async def on_command_error(error, ctx):
+	bot.stop_command_timer(ctx)
+	bot.command_errors.inc(error = error.__class__.__name__)
 	channel = ctx.message.channel
 	if isinstance(error, commands.MissingRequiredArgument):
 		await bot.send_cmd_help(ctx)
@@ -221,8 +377,15 @@ async def on_command_error(error, ctx):
 
 bot.load_extension("cogs.general")
 bot.load_extension("cogs.dota")
+try:
+	# The coordinator stops its shards with SIGTERM. Logging out lets bot.run return, so that pending server settings are still written below.
+	bot.loop.add_signal_handler(signal.SIGTERM, lambda: bot.loop.create_task(bot.logout()))
+except NotImplementedError:
+	pass # Not supported on Windows
 try:
 	bot.run(bot.settings["token"])
 except discord.errors.LoginFailure:
 	print("The token provided in data/settings.json was not accepted. Please make sure it is valid.")
+finally:
+	bot.flush_server_settings()
 
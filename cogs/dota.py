@@ -1,7 +1,5 @@
 import asyncio
-import requests
-import time
-from json.decoder import JSONDecodeError
+from collections import OrderedDict
 
 try:
 	import discord
@@ -9,100 +7,75 @@ try:
 except ImportError:
 	print("Unable to load MatchUpdates cog. Check your discord.py installation.")
 
-LIVE_LEAGUE_GAMES_URL = "https://api.steampowered.com/IDOTA2Match_570/GetLiveLeagueGames/v0001/"
-MATCH_DETAILS_URL = "https://api.steampowered.com/IDOTA2Match_570/GetMatchDetails/V001/"
+from .utils.outbox import Outbox
+from .utils.feed import FeedClient
+from .utils.metadata import MetadataCache
+from .utils.render import AnnouncementRenderer, describe_series, MATCH_START, VICTORY_WITH_RESULT, VICTORY_WITHOUT_RESULT
+from .utils.tracker import Match, MatchList, MatchTracker, MATCH_STARTED, MATCH_FINISHED, MATCH_EVENTS
+
+OUTBOX_FILE = "data/outbox.json"
+SHARD_OUTBOX_FILE = "data/outbox_shard%s.json"
+FEED_POSITION_FILE = "data/feed_position.json"
+SHARD_FEED_POSITION_FILE = "data/feed_position_shard%s.json"
+ONGOING_PAGE_SIZE = 20 # Matches listed per page of the ongoing command, which keeps each page well short of Discord's limit on message length
+ONGOING_COOLDOWN = 10 # Seconds before the ongoing command can be used again in the same channel
 MATCH_CHANNEL_NOT_FOUND = "I wish to post in the designated channel for match updates but am unable to, for I lack the required permissions (or else the channel does not exist)."
 
-class Match:
-	def __init__(self, matchid, radiant_team, dire_team, gameno, seriestype):
-		self.matchid = matchid
-		self.radiant_team = radiant_team
-		self.dire_team = dire_team
-		self.gameno = gameno
-		self.seriestype = seriestype
-
-class MatchList:
-	def __init__(self, original = None):
-		self.matches = []
-		if original is not None:
-			for original_match in original:
-				self.matches.append(original_match)
-
-	def __len__(self):
-		return len(self.matches)
-
-	def __getitem__(self, key):
-		if not isinstance(key, int):
-			raise TypeError
-		if key >= len(self.matches):
-			raise IndexError
-		return self.matches[key]
-
-	def __missing__(self):
-		pass # I don't know what this does
-
-	def __setitem__(self):
-		pass # Is this really necessary?
-
-	def __delitem__(self, key):
-		if not isinstance(key, int):
-			raise TypeError
-		if key >= len(self.matches):
-			raise IndexError
-		del self.matches[key]
-
-	def __iter__(self):
-		for match in self.matches:
-			yield match
-
-	def __contains__(self, matchid):
-		for match in self.matches:
-			if match.matchid == matchid:
-				return True
-
-		return False
-
-	def append(self, matchid, radiant_team, dire_team, gameno, seriestype):
-		self.matches.append(Match(matchid, radiant_team, dire_team, gameno, seriestype))
-
-	def remove(self, matchid):
-		for match in self.matches:
-			if match.matchid == matchid:
-				self.matches.remove(match)
-				return
-
-		raise KeyError
+class SubscriberIndex:
+	# Keeps track of which channels should receive each kind of announcement, so that announcing does not involve going through every server's settings
 
-	def clear(self):
-		self.matches.clear()
+	def __init__(self):
+		self.channels = {kind: OrderedDict() for kind in (MATCH_START, VICTORY_WITH_RESULT, VICTORY_WITHOUT_RESULT)}
 
-	def get_match_by_id(self, matchid):
-		for match in self.matches:
-			if match.matchid == matchid:
-				return match
+	def get(self, kind):
+		# Returns the subscribed channels as an OrderedDict keyed by server ID
+		return self.channels[kind]
 
-		return None
+	def remove(self, server):
+		for subscribers in self.channels.values():
+			subscribers.pop(server.id, None)
 
-	def match_exists_with_details(self, radiant_team, dire_team, gameno):
-		# No need to include the series type as a parameter, as the participating teams and game number should be unique enough
-		for match in self.matches:
-			if match.radiant_team == radiant_team and match.dire_team == dire_team and match.gameno == gameno:
-				return True
+	def update(self, server, server_settings, channel):
+		self.remove(server)
+		if server_settings is None or channel is None:
+			return
 
-		return False
+		self.channels[MATCH_START][server.id] = channel
+		if server_settings["victory_messages"]:
+			kind = VICTORY_WITH_RESULT if server_settings["show_result"] else VICTORY_WITHOUT_RESULT
+			self.channels[kind][server.id] = channel
 
-	def purge_duplicates(self, matchid):
-		match = self.get_match_by_id(matchid)
-
-		for m in self.matches:
-			if m.radiant_team == match.radiant_team and m.dire_team == match.dire_team and m.gameno == match.gameno and m.matchid != match.matchid:
-				self.matches.remove(m)
+	def clear(self):
+		for subscribers in self.channels.values():
+			subscribers.clear()
 
 class Dota:
 	"""Cog for match updates"""
 
 	def __init__(self, bot):
 		self.bot = bot
+		# Matches are tracked here unless a collector (standalone, or the coordinator of a sharded bot) tracks them for us, in which case they are followed through its feed
+		self.remote = bot.settings["collector"] or bot.settings["shard_count"] > 1
+		self.tracker = None if self.remote else MatchTracker(bot.settings, bot.loop, bot.metrics)
+		position_file = FEED_POSITION_FILE if bot.shard_id is None else SHARD_FEED_POSITION_FILE % bot.shard_id
+		self.feed = FeedClient(self.handle_event, bot.settings["feed_host"], bot.settings["feed_port"], bot.settings["feed_path"], bot.settings["verbose"], position_file, bot.loop) if self.remote else None
+		# League and team names are kept up to date by the tracker, or else read from the file the collector keeps
+		self.metadata = self.tracker.metadata if self.tracker is not None else MetadataCache(bot.loop, verbose = bot.settings["verbose"])
+		self.renderer = AnnouncementRenderer(self.metadata.get_league_name)
+		self.ongoing_view = None # (match list, its version, pages), rebuilt only once matches have been added or removed
+		self.poll_task = None
+		self.metadata_task = None
+		self.subscribers = SubscriberIndex()
+		self.outbox = Outbox(bot, OUTBOX_FILE if bot.shard_id is None else SHARD_OUTBOX_FILE % bot.shard_id, bot.settings["announce_concurrency"])
+
+	def __unload(self):
+		if self.poll_task is not None:
+			self.poll_task.cancel()
+		if self.metadata_task is not None:
+			self.metadata_task.cancel()
+		self.outbox.stop()
+		if self.tracker is not None:
+			self.bot.loop.create_task(self.tracker.close())
 
 	def get_matches_channel(self, server):
 		return self.bot.server_settings_list[server.id]["matches_channel"]
@@ -113,230 +86,118 @@ class Dota:
 	def get_show_result(self, server):
 		return self.bot.server_settings_list[server.id]["show_result"]
 
-	async def say_match_start(self, msg):
-		serverlist = list(self.bot.servers)
-		for s in serverlist:
-			try: # Catching potential HTTPExceptions here is actually important, because if we don't then the background task will stop
-				matches_channel = self.bot.get_channel(self.get_matches_channel(s))
-				if matches_channel:
-					try:
-						await self.bot.send_message(matches_channel, msg)
-					except (discord.Forbidden, discord.NotFound, discord.InvalidArgument):
-						pass
-			except discord.HTTPException:
-				pass
-			#except Exception as e:
-			#	print("Unable to announce draft: %s" % e)
-
-	async def say_victory_message(self, msg_winner, msg_no_winner):
-		serverlist = list(self.bot.servers)
-		for s in serverlist:
-			if self.get_victory_messages(s):
-				try:
-					msg = msg_winner if self.get_show_result(s) else msg_no_winner
-					matches_channel = self.bot.get_channel(self.get_matches_channel(s))
-					if matches_channel:
-						try:
-							await self.bot.send_message(matches_channel, msg)
-						except (discord.Forbidden, discord.NotFound, discord.InvalidArgument):
-							pass
-				except discord.HTTPException:
-					pass
-				#except Exception as e:
-				#	print("Unable to announce end of match: %s" % e)
-
-	def get_names_from_league_game(self, game):
-		# Gets team names from a game provided by a GetLiveLeagueGames call. If a team has no name, it is "Radiant" or "Dire".
-		if "radiant_team" in game:
-			radiant_name = game["radiant_team"]["team_name"]
-		else:
-			radiant_name = "Radiant"
-
-		if "dire_team" in game:
-			dire_name = game["dire_team"]["team_name"]
-		else:
-			dire_name = "Dire"
-
-		return (radiant_name, dire_name)
-
-	def get_names_from_match_details(self, game):
-		# Gets team names from a game provided by a GetMatchDetails call. If a team has no name, it is "Radiant" or "Dire".
-		if "radiant_name" in game:
-			radiant_name = game["radiant_name"]
-		else:
-			radiant_name = "Radiant"
-
-		if "dire_name" in game:
-			dire_name = game["dire_name"]
-		else:
-			dire_name = "Dire"
-
-		return (radiant_name, dire_name)
-
-	def get_gameno_from_match_details(self, game):
-		# I don't know if Valve's API ever returns a match without radiant_score and dire_score fields
-		return game["radiant_score"] + game["dire_score"] + 1
-
-	async def show_new_match(self, game, radiant_name, dire_name, gameno):
-		if game["series_type"] == 0:
-			series_desc = "Best of 1"
-		elif game["series_type"] == 1:
-			series_desc = "Game %s of 3" % str(gameno)
-		elif game["series_type"] == 2:
-			series_desc = "Game %s of 5" % str(gameno)
-		else:
-			series_desc = "unknown series type %s" % str(game["series_type"]) # I don't think this is possible
-
-		await self.say_match_start("The draft for %s vs. %s is now underway (%s)." % (radiant_name, dire_name, series_desc))
+	def describe_league(self, leagueid):
+		name = self.metadata.get_league_name(leagueid)
+		return str(leagueid) if name is None else "%s (%s)" % (name, leagueid)
 
-	async def show_match_results(self, game):
-		# Not to be confused with show_result, the option for toggling whether the bot reveals the winner, duration, and kill score at the end
-		matchid = game["match_id"]
-		match = self.bot.ongoing_matches.get_match_by_id(matchid) # Look for the game in our list
-
-		if match.seriestype == 0:
-			series_string = ""
-		else:
-			series_string = "Game %s of " % match.gameno
-		
-		if game["radiant_win"]:
-			winner = match.radiant_team
-		else:
-			winner = match.dire_team
-
-		score = "%s-%s" % (game["radiant_score"], game["dire_score"])
-
-		m, s = divmod(game["duration"], 60)
-		min_string = "1 minute" if m == 1 else "%s minutes" % m
-
-		if s == 0:
-			sec_string = ""
-		elif s == 1:
-			sec_string = " and 1 second"
-		else:
-			sec_string = " and %s seconds" % s
-
-		msg_winner = "%s%s vs. %s has ended in %s victory, %s%s in. The final score was %s. Dotabuff: <https://www.dotabuff.com/matches/%s>" % (series_string, match.radiant_team, match.dire_team, winner, min_string, sec_string, score, matchid)
-		msg_no_winner = "%s%s vs. %s has ended. Dotabuff: <https://www.dotabuff.com/matches/%s>" % (series_string, match.radiant_team, match.dire_team, matchid)
-		await self.say_victory_message(msg_winner, msg_no_winner)
-
-	def make_request(self, url, matchid = ""):
+	def resolve_league(self, league):
+		# Accepts a league ID or (part of) a league's name. Returns the league ID, or None if no league matches.
 		try:
-			response = requests.get(url, params = {"key": self.bot.get_apikey(), "match_id": matchid})
-			response.raise_for_status() # Raise an exception if the request was unsuccessful (anything other than status code 200)
-			return response
-		except Exception as err:
-			if self.bot.settings["verbose"]:
-				print(err)
-			if response.status_code == 403:
-				print("The API key provided in data/settings.json was not accepted. Please make sure it is valid.")
-			raise
-
-	async def get_match_data(self):
+			return int(league)
+		except ValueError:
+			return self.metadata.find_league(league)
+
+	def update_subscriptions(self, server):
+		server_settings = self.bot.server_settings_list.get(server.id)
+		channel = self.bot.get_channel(server_settings["matches_channel"]) if server_settings else None
+		self.subscribers.update(server, server_settings, channel)
+
+	def rebuild_subscriptions(self):
+		self.subscribers.clear()
+		for server in list(self.bot.servers):
+			self.update_subscriptions(server)
+
+	async def on_ready(self):
+		self.rebuild_subscriptions()
+
+	async def on_server_join(self, server):
+		self.update_subscriptions(server)
+
+	async def on_server_remove(self, server):
+		self.subscribers.remove(server)
+
+	async def on_server_settings_change(self, server):
+		self.update_subscriptions(server)
+
+	async def on_channel_delete(self, channel):
+		if channel.server is not None:
+			self.update_subscriptions(channel.server)
+
+	async def broadcast(self, deliveries):
+		# deliveries is a list of (channel, message) tuples. They are handed to the outbox, which posts them concurrently (at most announce_concurrency at a time) and retries them if need be.
+		# Returns an OrderedDict mapping each server's ID to a future, resolved with None once its message is delivered or with the exception that made it undeliverable.
+		futures = await self.outbox.put(deliveries)
+		outcomes = OrderedDict((channel.server.id, future) for (channel, msg), future in zip(deliveries, futures))
+		if self.bot.settings["verbose"] and outcomes:
+			self.bot.loop.create_task(self.report_outcomes(outcomes))
+		return outcomes
+
+	async def report_outcomes(self, outcomes):
+		results = await asyncio.gather(*outcomes.values())
+		delivered = sum(1 for result in results if result is None)
+		print("Delivered announcement to %s of %s servers" % (delivered, len(results)))
+
+	async def announce(self, variants):
+		# variants maps kinds of announcement to their text, each of which goes to every channel subscribed to that kind
+		return await self.broadcast([(channel, msg) for kind, msg in variants.items() for channel in self.subscribers.get(kind).values()])
+
+	async def show_new_match(self, match):
+		await self.announce(self.renderer.render_start(match))
+
+	async def show_match_results(self, match, game):
+		await self.announce(self.renderer.render_results(match, game))
+
+	async def handle_event(self, event):
+		# Receives events from the tracker, whether it runs in this process or in a collector. Other cogs can listen for them too, as on_match_started, on_game_started, on_score_changed, on_series_point and on_match_finished, each taking the event.
+		if self.remote:
+			self.bot.ongoing_matches.apply(event)
+		if event["type"] in MATCH_EVENTS:
+			self.bot.dispatch(event["type"], event)
+
+		if event["type"] == MATCH_STARTED and event["announce"]:
+			await self.show_new_match(Match(**event["match"]))
+		elif event["type"] == MATCH_FINISHED:
+			await self.show_match_results(Match(**event["match"]), event["result"])
+
+	async def track_matches(self):
 		await self.bot.wait_until_ready()
-		while not self.bot.is_closed:
-			await asyncio.sleep(self.bot.next_interval)
-			self.bot.next_interval = self.bot.get_api_interval()
-			try:
-				response = self.make_request(LIVE_LEAGUE_GAMES_URL)
-			except Exception:
-				continue # Just try again next time
-
-			current_time = time.time()
-
-			if self.bot.settings["save_match_data"]:
-				file = open("matchdata%s.txt" % current_time, "w")
-				text = response.text.encode("utf-8")
-				file.write(str(text))
-
-			try:
-				games = response.json()["result"]["games"]
-			except JSONDecodeError:
-				continue
-
-			finished_matches = MatchList(self.bot.ongoing_matches)
-			for game in games:
-				league_ok = not self.bot.settings["filter_matches"] or game["league_id"] in self.bot.settings["notable_leagues"]
-				generic_ok = not self.bot.settings["filter_generic"] or "radiant_team" in game or "dire_team" in game
-				if league_ok and generic_ok and game["match_id"] > 0: # Valve's API occasionally gives us the dreaded "Match 0"
-					if game["match_id"] in self.bot.ongoing_matches:
-						finished_matches.remove(game["match_id"])
-					else:
-						radiant_name, dire_name = self.get_names_from_league_game(game)
-						gameno = game["radiant_series_wins"] + game["dire_series_wins"] + 1
-						seriestype = game["series_type"]
-
-						if self.bot.settings["verbose"]:
-							try:
-								print("[%s] Adding match %s to list (%s vs. %s, Game %s)" % (current_time, game["match_id"], radiant_name, dire_name, gameno))
-							except UnicodeEncodeError:
-								print("A new match has been added to the list, but could not be displayed here due to an encoding error")
-						
-						# This condition is needed to eliminate "duplicate" matches if the no_repeat_matches setting is enabled
-						if not (self.bot.settings["no_repeat_matches"] and self.bot.ongoing_matches.match_exists_with_details(radiant_name, dire_name, gameno)):
-							await self.show_new_match(game, radiant_name, dire_name, gameno)
-
-						self.bot.ongoing_matches.append(game["match_id"], radiant_name, dire_name, gameno, seriestype)
-
-			for finished in finished_matches:
-				await asyncio.sleep(2)
-				# Subtract the extra time waited to preserve the 20-second interval, but not if doing so would cause the time until the next call to be less than 2 seconds
-				if self.bot.next_interval > 4:
-					self.bot.next_interval -= 2
-
-				# Fetch specific game data
-				try:
-					postgame = self.make_request(MATCH_DETAILS_URL, matchid = finished.matchid)
-				except Exception:
-					continue
-
-				try:
-					game = postgame.json()["result"]
-				except JSONDecodeError:
-					continue
-
-				# It seems that sometimes the match disappears from the GetLiveLeagueGames listing, but hasn't actually ended yet. I don't know why...
-				if "radiant_win" not in game or "duration" not in game:
-					continue
-
-				if self.bot.settings["verbose"]:
-					radiant_name, dire_name = self.get_names_from_match_details(game)
-
-					try:
-						print("[%s] Match %s (%s vs. %s) finished" % (current_time, finished.matchid, radiant_name, dire_name))
-					except UnicodeEncodeError:
-						print("A match has finished, but could not be displayed here due to an encoding error")
-
-				await self.show_match_results(game)
-				self.bot.ongoing_matches.purge_duplicates(finished.matchid)
-				self.bot.ongoing_matches.remove(finished.matchid)
+		if self.remote:
+			await self.feed.run()
+		else:
+			await self.tracker.run()
+
+	def get_ongoing_pages(self):
+		matches = self.bot.ongoing_matches
+		if self.ongoing_view is None or self.ongoing_view[0] is not matches or self.ongoing_view[1] != matches.version:
+			lines = ["%s vs. %s (%s)" % (match.radiant_team, match.dire_team, describe_series(match.seriestype, match.gameno)) for match in matches]
+			pages = ["\n".join(lines[start:start + ONGOING_PAGE_SIZE]) for start in range(0, len(lines), ONGOING_PAGE_SIZE)]
+			if len(pages) == 1:
+				pages = ["Ongoing games:\n" + pages[0]]
+			else:
+				pages = ["Ongoing games (page %s of %s, use `%songoing <page>` to see the others):\n%s" % (number, len(pages), self.bot.settings["prefix"], page) for number, page in enumerate(pages, 1)]
+			self.ongoing_view = (matches, matches.version, pages)
+		return self.ongoing_view[2]
 
 	@commands.command()
-	async def ongoing(self):
-		"""Shows matches that are currently being tracked by the bot."""
-		if len(self.bot.ongoing_matches) > 0:
-			response = "Ongoing games:"
-			for match in self.bot.ongoing_matches:
-				if match.seriestype == 0:
-					series_string = "Best of 1"
-				elif match.seriestype == 1:
-					series_string = "Game %s of 3" % match.gameno
-				elif match.seriestype == 2:
-					series_string = "Game %s of 5" % match.gameno
-				else:
-					series_string = "unknown series type"
+	@commands.cooldown(1, ONGOING_COOLDOWN, commands.BucketType.channel)
+	async def ongoing(self, page: int = 1):
+		"""Shows matches that are currently being tracked by the bot (10s cooldown).
 
-				response += "\n%s vs. %s (%s)" % (match.radiant_team, match.dire_team, series_string)
-			await self.bot.say(response)
-		else:
+		Long lists are split into pages. Use a page number to see pages other than the first."""
+		pages = self.get_ongoing_pages()
+		if len(pages) == 0:
 			await self.bot.say("There are as yet no ongoing games.")
+		elif 1 <= page <= len(pages):
+			await self.bot.say(pages[page - 1])
+		else:
+			await self.bot.say("Alas, the ongoing games fill only %s." % ("1 page" if len(pages) == 1 else "%s pages" % len(pages)))
 
 	@commands.command()
 	async def leagues(self):
 		"""Displays leagues being tracked by the bot."""
 		leagues = self.bot.get_notable_leagues()
 		if len(leagues) > 0:
-			response = "Tracked leagues: " + ", ".join([str(item) for item in leagues])
+			response = "Tracked leagues: " + ", ".join([self.describe_league(item) for item in leagues])
 			await self.bot.say(response)
 		else:
 			await self.bot.say("There are as yet no leagues being tracked.")
@@ -347,7 +208,9 @@ class Dota:
 
 		Can only be used by the bot owner. Note that if this is called while any tracked matches are going on, they will probably be added right back to the list on the next API call."""
 		if self.bot.is_owner(ctx.message.author):
-			if len(self.bot.ongoing_matches) > 0:
+			if self.remote:
+				await self.bot.say("Alas, the matches are tracked by the collector rather than by me, and cannot be forgotten from here.")
+			elif len(self.bot.ongoing_matches) > 0:
 				self.bot.ongoing_matches.clear()
 				await self.bot.say("Done. Let them be forgotten like the dust which blows in the wind.")
 			else:
@@ -356,28 +219,38 @@ class Dota:
 			await self.bot.say("You have not the authority to issue such a command.")
 
 	@commands.command(pass_context = True)
-	async def addleague(self, ctx, league_id: int):
+	async def addleague(self, ctx, *, league):
 		"""Adds to the list of notable leagues.
 
-		Can only be used by the bot owner. Does not currently affect the notable_leagues field in settings.json, so any changes made using this command are not persistent between restarts."""
+		Accepts a league ID, or a league's name (or enough of it to tell it apart from other leagues). Can only be used by the bot owner. Does not currently affect the notable_leagues field in settings.json, so any changes made using this command are not persistent between restarts."""
 		if self.bot.is_owner(ctx.message.author):
+			if self.remote:
+				await self.bot.say("Alas, the leagues are chosen by the collector rather than by me. Change notable_leagues in settings.json and restart it instead.")
+				return
 			leagues = self.bot.get_notable_leagues()
-			if league_id in leagues:
+			league_id = self.resolve_league(league)
+			if league_id is None:
+				await self.bot.say("Alas, I know of no such league.")
+			elif league_id in leagues:
 				await self.bot.say("Oh? I am already tracking that league.")
 			else:
 				self.bot.add_notable_league(league_id)
-				await self.bot.say("I shall keep an eye out for matches in that league.")
+				await self.bot.say("I shall keep an eye out for matches in %s." % self.describe_league(league_id))
 		else:
 			await self.bot.say("You have not the authority to issue such a command.")
 
 	@commands.command(pass_context = True)
-	async def rmleague(self, ctx, league_id: int):
+	async def rmleague(self, ctx, *, league):
 		"""Removes from the list of notable leagues.
 
-		Can only be used by the bot owner. Does not currently affect the notable_leagues field in settings.json, so any changes made using this command are not persistent between restarts."""
+		Accepts a league ID, or a league's name (or enough of it to tell it apart from other leagues). Can only be used by the bot owner. Does not currently affect the notable_leagues field in settings.json, so any changes made using this command are not persistent between restarts."""
 		if self.bot.is_owner(ctx.message.author):
+			if self.remote:
+				await self.bot.say("Alas, the leagues are chosen by the collector rather than by me. Change notable_leagues in settings.json and restart it instead.")
+				return
 			leagues = self.bot.get_notable_leagues()
-			if league_id in leagues:
+			league_id = self.resolve_league(league)
+			if league_id is not None and league_id in leagues:
 				self.bot.remove_notable_league(league_id)
 				await self.bot.say("So be it. Matches in that league concern me no longer.")
 			else:
@@ -458,6 +331,13 @@ class Dota:
 def setup(bot):
 	dota = Dota(bot)
 	bot.add_cog(dota)
-	bot.ongoing_matches = MatchList()
-	bot.loop.create_task(dota.get_match_data())
+	if dota.tracker is not None:
+		bot.ongoing_matches = dota.tracker.matches
+		dota.tracker.listeners.append(dota.handle_event)
+		dota.tracker.load_state()
+	else:
+		bot.ongoing_matches = MatchList()
+		dota.metadata_task = bot.loop.create_task(dota.metadata.run())
+	dota.outbox.load()
+	dota.poll_task = bot.loop.create_task(dota.track_matches())
 	
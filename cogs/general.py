@@ -7,12 +7,15 @@ try:
 except ImportError:
 	print("Unable to load General cog. Check your discord.py installation.")
 
+from .utils.sender import WELCOME
+
 BOTNAMES = ["Agnes", "Alfred", "Archy", "Barty", "Benjamin", "Bertram",
 	"Bruni", "Buster", "Edith", "Ester", "Flo", "Francis", "Francisco", "Gil",
 	"Gob", "Gus", "Hank", "Harold", "Harriet", "Henry", "Jacques", "Jorge",
 	"Juan", "Kitty", "Lionel", "Louie", "Lucille", "Lupe", "Mabel", "Maeby",
 	"Marco", "Marta", "Maurice", "Maynard", "Mildred", "Monty", "Mordecai",
 	"Morty", "Pablo", "Seymour", "Stan", "Tobias", "Vivian", "Walter", "Wilbur"]
+WELCOME_MENTION_LIMIT = 50 # Members mentioned by name in a combined welcome message, which keeps it well under Discord's limit of 2000 characters
 WELCOME_CHANNEL_NOT_FOUND = "I wish to post in the designated channel for welcome messages but am unable to, for I lack the required permissions (or else the channel does not exist)."
 
 class General:
@@ -20,17 +23,44 @@ class General:
 
 	def __init__(self, bot):
 		self.bot = bot
+		self.join_batches = {} # Server ID -> members waiting to be welcomed together, when they were first queued, and the handle for welcoming them
+		self.last_welcome = {} # Server ID -> loop time of the last welcome message
+
+	def __unload(self):
+		for batch in self.join_batches.values():
+			batch["handle"].cancel()
+
+	async def wait_for_announcements(self):
+		# Nickname changes share a connection and rate limits with match announcements, so they wait until there are none left to post
+		dota = self.bot.get_cog("Dota")
+		if dota is not None:
+			await dota.outbox.wait_idle()
+
+	async def apply_nick(self, server, wait = True):
+		# A rename that an admin has just asked for (wait = False) goes ahead at once rather than after the announcements
+		if wait:
+			await self.wait_for_announcements()
+		try:
+			await self.bot.change_nickname(server.me, "%s Bot" % self.bot.nick)
+		except (discord.Forbidden, discord.NotFound):
+			pass
 
-	async def set_nick(self, newnick):
+	async def set_nick(self, newnick, spread = 0):
+		# The servers are renamed one at a time, in slots spaced evenly over spread seconds, instead of in one burst
 		self.bot.nick = newnick
 
-		serverlist = list(self.bot.servers)
-		for server in serverlist:
-			try:
-				if self.bot.server_settings_list[server.id]["auto_change_nick"]:
-					await self.bot.change_nickname(server.me, "%s Bot" % newnick)
-			except (discord.Forbidden, KeyError):
-				pass
+		serverlist = sorted((server for server in list(self.bot.servers) if self.bot.server_settings_list.get(server.id, {}).get("auto_change_nick")), key = lambda server: server.id)
+		if not serverlist:
+			return
+		slot = spread / len(serverlist)
+		started = self.bot.loop.time()
+		for i, server in enumerate(serverlist):
+			delay = started + i * slot - self.bot.loop.time()
+			if delay > 0:
+				await asyncio.sleep(delay)
+			if self.bot.nick != newnick:
+				return # Another nickname was chosen in the meantime, which is being applied to every server already
+			await self.apply_nick(server)
 
 	async def unset_nick(self, server):
 		try:
@@ -69,27 +99,68 @@ class General:
 		welcome_channel = self.bot.server_settings_list[server.id]["welcome_channel"]
 		if welcome_channel:
 			try:
-				await self.bot.send_message(self.bot.get_channel(welcome_channel), msg)
+				await self.bot.send_message(self.bot.get_channel(welcome_channel), msg, priority = WELCOME)
 			except (discord.Forbidden, discord.NotFound, discord.InvalidArgument):
-				await self.bot.send_message(server.default_channel, WELCOME_CHANNEL_NOT_FOUND)
+				await self.bot.send_message(server.default_channel, WELCOME_CHANNEL_NOT_FOUND, priority = WELCOME)
 		else:
-			await self.bot.send_message(server.default_channel, msg)
+			await self.bot.send_message(server.default_channel, msg, priority = WELCOME)
 
 	# As auto_change_nick is now off by default, there is no need for an on_server_join() method
 
+	def format_welcome(self, members):
+		if len(members) == 1:
+			return "%s has joined the server. Welcome!" % members[0].mention
+
+		mentions = [member.mention for member in members[:WELCOME_MENTION_LIMIT]]
+		if len(members) > WELCOME_MENTION_LIMIT:
+			mentions.append("%s others" % (len(members) - WELCOME_MENTION_LIMIT))
+		return "%s and %s have joined the server. Welcome!" % (", ".join(mentions[:-1]), mentions[-1])
+
 	async def on_member_join(self, member):
 		serv = member.server
-		if self.bot.server_settings_list[serv.id]["welcome_messages"]:
-			await self.say_welcome_channel(serv, "%s has joined the server. Welcome!" % member.mention)
+		if not self.bot.server_settings_list[serv.id]["welcome_messages"]:
+			return
+
+		# A member joining a quiet server is welcomed straight away. Anyone joining soon after waits up to welcome_batch_window seconds for others to join, and they are all welcomed together.
+		window = self.bot.settings["welcome_batch_window"]
+		now = self.bot.loop.time()
+		batch = self.join_batches.get(serv.id)
+		if batch is None:
+			if window <= 0 or now - self.last_welcome.get(serv.id, -window) >= window:
+				self.last_welcome[serv.id] = now
+				await self.say_welcome_channel(serv, self.format_welcome([member]))
+				return
+			batch = self.join_batches[serv.id] = {"members": [], "started": now, "handle": None}
+		else:
+			batch["handle"].cancel()
 
-	# Change nickname every so often
+		# Each join extends the wait, but never past welcome_batch_max_delay seconds after the first member in the batch joined
+		batch["members"].append(member)
+		delay = min(window, batch["started"] + self.bot.settings["welcome_batch_max_delay"] - now)
+		batch["handle"] = self.bot.loop.call_later(max(0, delay), self.flush_welcome, serv)
+
+	def flush_welcome(self, server):
+		batch = self.join_batches.pop(server.id)
+		self.last_welcome[server.id] = self.bot.loop.time()
+		self.bot.loop.create_task(self.say_batch_welcome(server, batch["members"]))
+
+	async def say_batch_welcome(self, server, members):
+		# Runs as a task of its own, with nobody to hand errors to, so they are reported here
+		try:
+			await self.say_welcome_channel(server, self.format_welcome(members))
+		except (discord.HTTPException, discord.InvalidArgument) as err:
+			print("Unable to welcome new members to %s: %r" % (server.name, err))
+
+	# Change nickname every so often, spreading the changes over the interval so that each server takes its turn
 	async def change_nick(self):
 		await self.bot.wait_until_ready()
 		while not self.bot.is_closed:
+			started = self.bot.loop.time()
+			interval = self.bot.settings["changenick_interval"]
 			serverlist = list(self.bot.servers)
 			if len(serverlist) > 0:
-				await self.set_nick(self.choose_nick())
-			await asyncio.sleep(self.bot.settings["changenick_interval"])
+				await self.set_nick(self.choose_nick(), spread = interval)
+			await asyncio.sleep(max(0, started + interval - self.bot.loop.time()))
 
 	@commands.command(pass_context = True)
 	async def globalnamereset(self, ctx):
@@ -108,6 +179,27 @@ class General:
 		else:
 			await self.bot.say("You have not the authority to issue such a command.")
 
+	@commands.command(pass_context = True)
+	async def metrics(self, ctx):
+		"""Shows how long things have been taking.
+
+		Can only be used by the bot owner. The same figures can be served to Prometheus by setting metrics_port in settings.json."""
+		if self.bot.is_owner(ctx.message.author):
+			lines = self.bot.metrics.summarize()
+			if not lines:
+				await self.bot.say("There is as yet nothing to tell.")
+				return
+
+			page = ""
+			for line in lines:
+				if page and len(page) + len(line) > 1900: # Keep each message under Discord's limit of 2000 characters
+					await self.bot.say("```%s```" % page)
+					page = ""
+				page += line + "\n"
+			await self.bot.say("```%s```" % page)
+		else:
+			await self.bot.say("You have not the authority to issue such a command.")
+
 	@commands.command(pass_context = True, no_pm = True)
 	async def welcomechannel(self, ctx, channel = None):
 		"""Sets the channel for posting welcome messages.
@@ -173,7 +265,9 @@ class General:
 					await self.bot.say("Automatic nickname changing is now disabled.")
 				else:
 					self.set_auto_change_nick(server, True)
-					await self.set_nick(self.choose_nick())
+					if not self.bot.nick:
+						self.bot.nick = self.choose_nick()
+					await self.apply_nick(server, wait = False)
 					await self.bot.say("Automatic nickname changing is now enabled.")
 			else:
 				await self.bot.say("You have not the authority to issue such a command.")
@@ -203,7 +297,7 @@ class General:
 		emb.add_field(name = "Why am I not getting updates for matches?", value = "Make sure a channel is set through the `%smatchchannel` command. Also, make sure you've given the bot permissions to talk in that channel." % self.bot.get_prefix())
 		emb.add_field(name = "What's with the nicknames? Can I set my own nickname for the bot?", value = "If the `autochangename` setting is on, the bot will automatically change its name periodically to the name of a random Dota 2 bot. To set your own nickname for the bot, disable `autochangename` and then right-click the bot and select \"Change Nickname\".")
 		emb.add_field(name = "Will you periodically add new leagues to the bot?", value = "I will on my instance of the bot. If you're running your own instance of the bot, you'll have to add new leagues through the `%saddleague` command or by editing the settings.json file." % self.bot.get_prefix())
-		emb.add_field(name = "How do I find out what ID a tournament comes under?", value = "You can get league IDs by calling Valve's API (https://api.steampowered.com/IDOTA2Match_570/GetLeagueListing/v1/?key=YOUR_API_KEY). In the future I hope to have some way to let people know the league IDs of upcoming tournaments more easily.")
+		emb.add_field(name = "How do I find out what ID a tournament comes under?", value = "You don't need to: the `%saddleague` command also accepts a tournament's name. If you want the ID anyway, `%saddleague` mentions it, or you can get league IDs by calling Valve's API (https://api.steampowered.com/IDOTA2Match_570/GetLeagueListing/v1/?key=YOUR_API_KEY)." % (self.bot.get_prefix(), self.bot.get_prefix()))
 		emb.set_footer(text = "Check @Dota2HelperBot on Twitter for development news and updates")
 
 		try:
@@ -0,0 +1,101 @@
+import asyncio
+import gzip
+import json
+
+from .dataIO import DailyLog
+from .steamapi import SteamAPIError, PollScheduler, LIVE_LEAGUE_GAMES, MATCH_DETAILS
+
+CAPTURED_ENDPOINTS = (LIVE_LEAGUE_GAMES, MATCH_DETAILS) # Other requests, such as for the league listing, have nothing to do with tracking matches and are not worth the space
+
+class CaptureWriter(DailyLog):
+	"""Records responses from Valve's API for replaying later
+
+	Records are appended to a gzipped file per day, one JSON object per line, holding the time, endpoint, parameters (minus the API key), status and body of a response.
+	Every record is written as a separate gzip member, so a file cut short by a crash loses at most its last record."""
+
+	def __init__(self, directory):
+		super().__init__(directory, "capture-%Y%m%d.jsonl.gz", gzip.open)
+
+	def record(self, timestamp, endpoint, params, status, body):
+		if endpoint not in CAPTURED_ENDPOINTS:
+			return
+		line = json.dumps({"time": timestamp, "endpoint": endpoint, "params": params, "status": status, "body": body}) + "\n"
+		self.append(timestamp, line.encode("utf-8"))
+
+def read_capture(path):
+	# Yields the records in a capture file in the order they were written
+	with gzip.open(path, "rt", encoding = "utf-8") as capture:
+		try:
+			for line in capture:
+				try:
+					yield json.loads(line)
+				except ValueError:
+					return # A record that was only partly written before a crash
+		except EOFError:
+			return
+
+class ReplaySteamAPI:
+	"""Stands in for SteamAPI, answering requests from captured responses instead of from Valve
+
+	Each request for the live league games is answered with the next captured listing. Requests for match details are answered with the latest captured response for that match from before the next listing, as that is what Valve would have said at the time. Requests to any other endpoint fail, as they are never captured."""
+
+	def __init__(self, records):
+		self.polls = []
+		self.details = {}
+		for record in records:
+			if record["endpoint"] == LIVE_LEAGUE_GAMES:
+				self.polls.append(record)
+			elif record["endpoint"] == MATCH_DETAILS:
+				self.details.setdefault(str(record["params"].get("match_id")), []).append(record)
+		self.position = 0 # Index of the next listing to serve
+		self.requests = 0
+		self.exhausted = asyncio.Event()
+
+	def get_clock(self):
+		# The time the replay has reached: just before the next listing was captured
+		if self.position < len(self.polls):
+			return self.polls[self.position]["time"]
+		return float("inf")
+
+	def get_gap(self):
+		# Seconds between the listing that was served last and the next one
+		if 0 < self.position < len(self.polls):
+			return self.polls[self.position]["time"] - self.polls[self.position - 1]["time"]
+		return 0
+
+	def _answer(self, endpoint, record):
+		if record["status"] != 200:
+			raise SteamAPIError(endpoint, record["status"], "captured error")
+		return record["body"]
+
+	async def request(self, endpoint, **params):
+		if endpoint not in CAPTURED_ENDPOINTS:
+			raise SteamAPIError(endpoint, reason = "not captured")
+		self.requests += 1
+		if endpoint == LIVE_LEAGUE_GAMES:
+			if self.position >= len(self.polls):
+				self.exhausted.set()
+				raise SteamAPIError(endpoint, reason = "end of capture")
+			record = self.polls[self.position]
+			self.position += 1
+			return self._answer(endpoint, record)
+
+		clock = self.get_clock()
+		captured = [record for record in self.details.get(str(params.get("match_id")), []) if record["time"] < clock]
+		if not captured:
+			raise SteamAPIError(endpoint, reason = "no captured response for match %s" % params.get("match_id"))
+		return self._answer(endpoint, captured[-1])
+
+	async def close(self):
+		pass
+
+class ReplayScheduler(PollScheduler):
+	# Waits between polls for as long as passed between the captured listings, sped up by the given factor
+
+	def __init__(self, api, speed, rate = 1000, capacity = 1000, loop = None):
+		super().__init__(0, 0, 0, rate, capacity, loop = loop)
+		self.api = api
+		self.speed = speed
+
+	async def wait(self):
+		await asyncio.sleep(self.api.get_gap() / self.speed if self.speed > 0 else 0)
@@ -0,0 +1,61 @@
+import asyncio
+
+from .metrics import Registry, MetricsServer
+from .tracker import MatchTracker
+from .feed import FeedServer, EventLog, describe_address
+
+EVENT_LOG_DIRECTORY = "data/events"
+SUBSCRIBER_TIMEOUT = 300 # Longest to hold off polling while waiting for the expected subscribers to connect
+
+class Collector:
+	"""Polls Valve's API on behalf of any number of bots, which follow the tracked matches through a local feed
+
+	This is what runs in the standalone collector (Dota2Collector.py) and in the coordinator of a sharded bot. With event_log enabled, every event is also appended to a file in data/events/."""
+
+	def __init__(self, settings, loop):
+		self.settings = settings
+		self.loop = loop
+		self.metrics = Registry()
+		self.tracker = MatchTracker(settings, loop, self.metrics)
+		self.feed = FeedServer(self.tracker, settings["feed_host"], settings["feed_port"], settings["feed_path"])
+		self.log = EventLog(EVENT_LOG_DIRECTORY) if settings["event_log"] else None
+		self.metrics_server = None
+
+	def get_address(self):
+		return describe_address(self.settings["feed_host"], self.settings["feed_port"], self.settings["feed_path"])
+
+	async def start(self):
+		# Raises OSError if the feed cannot be served
+		self.tracker.load_state()
+		await self.feed.start()
+		self.tracker.listeners.append(self.feed.publish)
+		if self.log is not None:
+			self.tracker.listeners.append(self.write_log)
+
+		if self.settings["metrics_port"]:
+			self.metrics_server = MetricsServer(self.metrics, self.settings["metrics_host"], self.settings["metrics_port"])
+			try:
+				await self.metrics_server.start()
+			except OSError as err:
+				print("Unable to serve metrics: %s" % err)
+
+	async def write_log(self, event):
+		try:
+			await self.loop.run_in_executor(None, self.log.record, event)
+		except OSError as err:
+			print("Unable to write to the event log: %s" % err)
+
+	async def run(self, subscribers = 0):
+		# Holds off polling until that many subscribers have connected (or SUBSCRIBER_TIMEOUT has passed), so that the results of matches that finished while they were down are not published before they can hear them
+		if subscribers > 0:
+			try:
+				await asyncio.wait_for(self.feed.wait_for_subscribers(subscribers), SUBSCRIBER_TIMEOUT)
+			except asyncio.TimeoutError:
+				print("Only %s of %s subscribers have connected to the match feed. Polling anyway..." % (len(self.feed.subscribers), subscribers))
+		await self.tracker.run()
+
+	async def close(self):
+		self.feed.close()
+		if self.metrics_server is not None:
+			self.metrics_server.close()
+		await self.tracker.close()
@@ -0,0 +1,42 @@
+import json
+import os
+import threading
+import time
+
+def save_json(path, data):
+	# Writes to a temporary file first and then renames it over the old one, so a crash midway never leaves a truncated file behind
+	directory = os.path.dirname(path)
+	if directory:
+		os.makedirs(directory, exist_ok = True)
+
+	temp_path = "%s.tmp" % path
+	with open(temp_path, "w", encoding = "utf-8") as temp_file:
+		json.dump(data, temp_file, indent = 4)
+		temp_file.flush()
+		os.fsync(temp_file.fileno())
+	os.replace(temp_path, path)
+
+def load_json(path):
+	with open(path, encoding = "utf-8") as json_data:
+		return json.load(json_data)
+
+class DailyLog:
+	"""Appends data to a file per day (in UTC), named by passing pattern to strftime, in directory
+
+	The files are only ever appended to, and opener (open, or gzip.open for compressed files) is given a path and a mode of "ab". Data can be written from executor threads."""
+
+	def __init__(self, directory, pattern, opener = open):
+		self.directory = directory
+		self.pattern = pattern
+		self.opener = opener
+		self._lock = threading.Lock()
+
+	def get_path(self, timestamp):
+		return os.path.join(self.directory, time.strftime(self.pattern, time.gmtime(timestamp)))
+
+	def append(self, timestamp, data):
+		# data is bytes, which go in the file for the day of timestamp
+		with self._lock:
+			os.makedirs(self.directory, exist_ok = True)
+			with self.opener(self.get_path(timestamp), "ab") as log:
+				log.write(data)
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+from .dataIO import save_json, load_json, DailyLog
+
+RECONNECT_BASE = 1 # Seconds to wait before reconnecting to the feed; doubles with every failed attempt in a row
+RECONNECT_MAX = 60
+DRAIN_TIMEOUT = 10 # Subscribers that fall this many seconds behind are disconnected, rather than holding up the others
+LINE_LIMIT = 2 ** 20
+BACKLOG_SIZE = 1000 # Events kept by the server for subscribers that reconnect after missing some
+HELLO_TIMEOUT = 10 # Seconds a new subscriber has to say which events it has already seen
+FEED_START = "feed" # First line sent to a subscriber, with the epoch of the server
+
+def encode_event(event):
+	return json.dumps(event, separators = (",", ":")).encode("utf-8") + b"\n"
+
+def describe_address(host, port, path):
+	return path if path else "%s:%s" % (host, port)
+
+class FeedServer:
+	"""Sends a tracker's events to other processes over a local connection, one JSON object per line
+
+	The feed is served on a Unix socket at path if one is given, and on a TCP port otherwise.
+	Events are numbered in the order they are published, and the last BACKLOG_SIZE are kept. A subscriber starts by sending the epoch and number of the last event it saw (an empty object if it has seen none), and is sent every kept event after that one, so that results published while it was away are not lost. It is then sent a snapshot of the tracked matches, so that it knows what is going on however long it was away.
+	The epoch is the time the server started, in milliseconds. Numbering starts again with every epoch, so a subscriber that last saw an earlier epoch is sent all of the kept events."""
+
+	def __init__(self, tracker, host = "127.0.0.1", port = 9151, path = ""):
+		self.tracker = tracker
+		self.host = host
+		self.port = port
+		self.path = path
+		self.server = None
+		self.subscribers = set()
+		self.joined = asyncio.Event()
+		self.epoch = int(time.time() * 1000)
+		self.sequence = 0
+		self.backlog = deque(maxlen = BACKLOG_SIZE) # (number, encoded event)
+
+	async def start(self):
+		if self.path:
+			if os.path.exists(self.path):
+				os.remove(self.path) # Left behind by a collector that did not shut down cleanly
+			self.server = await asyncio.start_unix_server(self._handle, self.path)
+		else:
+			self.server = await asyncio.start_server(self._handle, self.host, self.port)
+
+	def get_replay(self, epoch, number):
+		# Returns the kept events that a subscriber which last saw event number of epoch has missed. One that has seen nothing at all only needs to know what is going on now.
+		if epoch is None:
+			return []
+		if epoch != self.epoch or not isinstance(number, int):
+			number = 0
+		return [line for kept, line in self.backlog if kept > number]
+
+	async def wait_for_subscribers(self, count):
+		while len(self.subscribers) < count:
+			self.joined.clear()
+			await self.joined.wait()
+
+	async def _handle(self, reader, writer):
+		try:
+			hello = json.loads((await asyncio.wait_for(reader.readline(), HELLO_TIMEOUT)).decode("utf-8"))
+			epoch, number = hello.get("epoch"), hello.get("seq")
+		except (asyncio.TimeoutError, ConnectionError, ValueError, AttributeError):
+			epoch, number = None, None
+
+		# The missed events and the snapshot are written before the subscriber is added, so nothing published afterwards can overtake them
+		writer.write(encode_event({"type": FEED_START, "epoch": self.epoch}))
+		for line in self.get_replay(epoch, number):
+			writer.write(line)
+		snapshot = self.tracker.get_snapshot()
+		snapshot["seq"] = self.sequence
+		writer.write(encode_event(snapshot))
+		self.subscribers.add(writer)
+		self.joined.set()
+		try:
+			# Subscribers have nothing to say, but reading tells us when they go away
+			while await reader.read(1024):
+				pass
+		except ConnectionError:
+			pass
+		finally:
+			self.subscribers.discard(writer)
+			writer.close()
+
+	async def _drain(self, writer):
+		try:
+			await asyncio.wait_for(writer.drain(), DRAIN_TIMEOUT)
+		except (asyncio.TimeoutError, ConnectionError):
+			self.subscribers.discard(writer)
+			writer.close()
+
+	async def publish(self, event):
+		self.sequence += 1
+		event["seq"] = self.sequence
+		line = encode_event(event)
+		self.backlog.append((self.sequence, line))
+		writers = list(self.subscribers)
+		for writer in writers:
+			writer.write(line)
+		await asyncio.gather(*[self._drain(writer) for writer in writers])
+
+	def close(self):
+		if self.server is not None:
+			self.server.close()
+			self.server = None
+			if self.path and os.path.exists(self.path):
+				os.remove(self.path)
+		for writer in list(self.subscribers):
+			writer.close()
+		self.subscribers.clear()
+
+class FeedClient:
+	# Receives events from a FeedServer and hands each one to handler, reconnecting whenever the connection is lost
+	# The last event handled is saved to position_file (if given), so that events published while the client is not running are handed over when it next connects
+
+	def __init__(self, handler, host = "127.0.0.1", port = 9151, path = "", verbose = False, position_file = None, loop = None):
+		self.handler = handler
+		self.host = host
+		self.port = port
+		self.path = path
+		self.verbose = verbose
+		self.position_file = position_file
+		self.loop = loop if loop is not None else asyncio.get_event_loop()
+		self.position = {} # Epoch of the server and number of the last event handled
+
+	def get_address(self):
+		return describe_address(self.host, self.port, self.path)
+
+	async def connect(self):
+		if self.path:
+			return await asyncio.open_unix_connection(self.path, limit = LINE_LIMIT)
+		return await asyncio.open_connection(self.host, self.port, limit = LINE_LIMIT)
+
+	def load_position(self):
+		if self.position_file is None:
+			return
+		try:
+			position = load_json(self.position_file)
+			if isinstance(position, dict):
+				self.position = position
+		except FileNotFoundError:
+			pass
+		except ValueError:
+			print("Could not load %s. Match updates published while the bot was down may be missed." % self.position_file)
+
+	async def save_position(self):
+		if self.position_file is None:
+			return
+		try:
+			await self.loop.run_in_executor(None, save_json, self.position_file, dict(self.position))
+		except OSError as err:
+			print("Unable to save the position in the match feed: %s" % err)
+
+	async def run(self):
+		self.load_position()
+		delay = RECONNECT_BASE
+		while True:
+			try:
+				reader, writer = await self.connect()
+			except OSError as err:
+				if self.verbose:
+					print("Unable to connect to the match feed at %s: %s" % (self.get_address(), err))
+				await asyncio.sleep(delay)
+				delay = min(RECONNECT_MAX, delay * 2)
+				continue
+
+			delay = RECONNECT_BASE
+			if self.verbose:
+				print("Connected to the match feed at %s" % self.get_address())
+			epoch = None
+			try:
+				writer.write(encode_event(self.position))
+				while True:
+					line = await reader.readline()
+					if not line:
+						break
+					try:
+						event = json.loads(line.decode("utf-8"))
+					except ValueError:
+						continue
+					if event.get("type") == FEED_START:
+						epoch = event.get("epoch")
+						continue
+					try:
+						await self.handler(event)
+					except Exception as err:
+						print("Unable to handle a %s event: %r" % (event.get("type"), err))
+					if "seq" in event and epoch is not None:
+						self.position = {"epoch": epoch, "seq": event["seq"]}
+						await self.save_position()
+			except (ConnectionError, ValueError):
+				pass # ValueError is raised for a line longer than LINE_LIMIT, after which the stream cannot be trusted
+			finally:
+				writer.close()
+
+			if self.verbose:
+				print("Lost the connection to the match feed. Reconnecting...")
+			await asyncio.sleep(delay)
+
+class EventLog(DailyLog):
+	"""Appends a tracker's events to a file per day, one JSON object per line, for anything else that wants to follow along
+
+	The files are only ever appended to, so they can be followed with tail -f or read back later."""
+
+	def __init__(self, directory):
+		super().__init__(directory, "events-%Y%m%d.jsonl")
+
+	def record(self, event):
+		self.append(event.get("time", time.time()), encode_event(event))
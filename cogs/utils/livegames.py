@@ -0,0 +1,79 @@
+import json
+from collections import OrderedDict
+
+# States a tracked match can be in, as far as GetLiveLeagueGames can tell us
+DRAFT = "draft"
+IN_PROGRESS = "in progress"
+DISAPPEARED = "disappeared" # No longer listed, but not known to be over until GetMatchDetails says so
+
+def parse_live_league_games(text, leagues = None):
+	"""Extracts the games from the body of a GetLiveLeagueGames response
+
+	If leagues is given, only games from those leagues are returned.
+	Raises ValueError if the response is malformed."""
+	try:
+		games = json.loads(text)["result"]["games"]
+	except (KeyError, TypeError):
+		raise ValueError("No games array in response")
+
+	if leagues is None:
+		return games
+	return [game for game in games if game.get("league_id") in leagues]
+
+def get_game_state(game):
+	# The scoreboard's clock only starts running once the draft is over
+	scoreboard = game.get("scoreboard")
+	if scoreboard and scoreboard.get("duration", 0) > 0:
+		return IN_PROGRESS
+	return DRAFT
+
+def get_kill_score(game):
+	scoreboard = game.get("scoreboard")
+	if not scoreboard:
+		return (0, 0)
+	return (scoreboard.get("radiant", {}).get("score", 0), scoreboard.get("dire", {}).get("score", 0))
+
+def get_wins_needed(seriestype):
+	# Series type 0 is a best of 1, 1 a best of 3 and 2 a best of 5
+	return seriestype + 1 if seriestype in (0, 1, 2) else None
+
+def is_series_point(seriestype, radiant_wins, dire_wins):
+	# Whether the winner of this game could take the series. A best of 1 does not count, as there is no series to speak of.
+	needed = get_wins_needed(seriestype)
+	return needed is not None and needed > 1 and max(radiant_wins, dire_wins) == needed - 1
+
+class SnapshotDiff:
+	"""Differences between two successive GetLiveLeagueGames snapshots
+
+	started, continuing and finished are lists of match IDs, in the order the matches appear in their snapshot. transitions maps the ID of every match whose state changed to a tuple of its old and new states (the old state is None for matches that just started)."""
+
+	__slots__ = ("started", "continuing", "finished", "transitions")
+
+	def __init__(self):
+		self.started = []
+		self.continuing = []
+		self.finished = []
+		self.transitions = OrderedDict()
+
+	def __bool__(self):
+		return bool(self.started or self.finished or self.transitions)
+
+def diff_snapshots(previous, current):
+	# previous and current map match IDs to states. Matches that were already missing from previous keep being reported as finished until they are dropped from it.
+	diff = SnapshotDiff()
+	for matchid, state in current.items():
+		old_state = previous.get(matchid)
+		if old_state is None:
+			diff.started.append(matchid)
+		else:
+			diff.continuing.append(matchid)
+		if old_state != state:
+			diff.transitions[matchid] = (old_state, state)
+
+	for matchid, old_state in previous.items():
+		if matchid not in current:
+			diff.finished.append(matchid)
+			if old_state != DISAPPEARED:
+				diff.transitions[matchid] = (old_state, DISAPPEARED)
+
+	return diff
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import time
+from json.decoder import JSONDecodeError
+
+from .dataIO import save_json, load_json
+from .steamapi import SteamAPIError, LEAGUE_LISTING
+
+METADATA_FILE = "data/metadata.json"
+REFRESH_INTERVAL = 24 * 3600 # Leagues are added rarely, so the listing is fetched once a day
+RETRY_INTERVAL = 600 # Seconds to wait before trying again after failing to fetch the listing
+RELOAD_INTERVAL = 3600 # How often a cache without access to the API reads the file again
+
+class MetadataCache:
+	"""Names of leagues and teams, kept on disk and refreshed in the background
+
+	League names come from GetLeagueListing, while team names are learned from the live games the tracker sees, and stand in when a team turns up without its name. Lookups are dict lookups, so announcements and commands never have to wait for Valve's API.
+	Without request (a coroutine function taking an endpoint and parameters, like MatchTracker.make_request), the file is read again every so often instead, which suits a bot whose collector keeps it up to date."""
+
+	def __init__(self, loop, path = METADATA_FILE, request = None, verbose = False):
+		self.loop = loop
+		self.path = path
+		self.request = request
+		self.verbose = verbose
+		self.leagues = {} # League ID -> name
+		self.league_ids = {} # Name in lower case -> league ID
+		self.teams = {} # Team ID -> name
+		self.updated = 0 # When the league listing was last fetched
+		self.dirty = False
+
+	def _set_leagues(self, leagues):
+		self.leagues = leagues
+		self.league_ids = {name.lower(): leagueid for leagueid, name in leagues.items()}
+
+	def load(self):
+		try:
+			data = load_json(self.path)
+			self._set_leagues({int(leagueid): name for leagueid, name in data["leagues"].items()})
+			self.teams = {int(teamid): name for teamid, name in data["teams"].items()}
+			self.updated = data["updated"]
+		except FileNotFoundError:
+			return
+		except (ValueError, KeyError, TypeError, AttributeError):
+			print("Could not load %s. League names will be fetched again." % self.path)
+
+	async def save(self):
+		data = {"leagues": {str(leagueid): name for leagueid, name in self.leagues.items()}, "teams": {str(teamid): name for teamid, name in self.teams.items()}, "updated": self.updated}
+		self.dirty = False
+		try:
+			await self.loop.run_in_executor(None, save_json, self.path, data)
+		except OSError as err:
+			print("Unable to save league and team names: %s" % err)
+
+	def get_league_name(self, leagueid):
+		return self.leagues.get(leagueid)
+
+	def find_league(self, name):
+		# Returns the ID of the league with the given name, or failing that the only league whose name contains it, or None
+		leagueid = self.league_ids.get(name.lower())
+		if leagueid is not None:
+			return leagueid
+		matches = [leagueid for league_name, leagueid in self.league_ids.items() if name.lower() in league_name]
+		return matches[0] if len(matches) == 1 else None
+
+	def get_team_name(self, teamid):
+		return self.teams.get(teamid)
+
+	def learn_team(self, teamid, name):
+		if teamid and name and self.teams.get(teamid) != name:
+			self.teams[teamid] = name
+			self.dirty = True
+
+	async def refresh(self):
+		# Returns whether the listing was fetched
+		try:
+			listing = json.loads(await self.request(LEAGUE_LISTING, language = "en"))
+			leagues = {league["leagueid"]: league["name"] for league in listing["result"]["leagues"]}
+		except (SteamAPIError, JSONDecodeError, KeyError, TypeError):
+			return False
+
+		self._set_leagues(leagues)
+		self.updated = time.time()
+		await self.save()
+		if self.verbose:
+			print("Fetched the names of %s leagues" % len(leagues))
+		return True
+
+	async def run(self):
+		self.load()
+		while True:
+			if self.request is None:
+				await asyncio.sleep(RELOAD_INTERVAL)
+				await self.loop.run_in_executor(None, self.load)
+				continue
+
+			due = self.updated + REFRESH_INTERVAL - time.time()
+			if due > 0 and self.leagues:
+				await asyncio.sleep(due)
+			if not await self.refresh():
+				await asyncio.sleep(RETRY_INTERVAL)
@@ -0,0 +1,171 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _format_labels(labels, extra = ()):
+	pairs = list(labels) + list(extra)
+	if not pairs:
+		return ""
+	return "{%s}" % ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in pairs)
+
+class Metric:
+	kind = "untyped"
+
+	def __init__(self, name, description):
+		self.name = name
+		self.description = description
+		self.values = OrderedDict() # Sorted tuple of label pairs -> value
+
+	def _key(self, labels):
+		return tuple(sorted(labels.items()))
+
+	def render(self):
+		lines = ["# HELP %s %s" % (self.name, self.description), "# TYPE %s %s" % (self.name, self.kind)]
+		for labels, value in self.values.items():
+			lines.append("%s%s %s" % (self.name, _format_labels(labels), value))
+		return lines
+
+	def summarize(self):
+		return ["%s%s: %s" % (self.name, _format_labels(labels), value) for labels, value in self.values.items()]
+
+class Counter(Metric):
+	kind = "counter"
+
+	def inc(self, amount = 1, **labels):
+		key = self._key(labels)
+		self.values[key] = self.values.get(key, 0) + amount
+
+	def get(self, **labels):
+		return self.values.get(self._key(labels), 0)
+
+class Gauge(Metric):
+	kind = "gauge"
+
+	def set(self, value, **labels):
+		self.values[self._key(labels)] = value
+
+	def get(self, **labels):
+		return self.values.get(self._key(labels), 0)
+
+class _Timer:
+	def __init__(self, histogram, labels):
+		self.histogram = histogram
+		self.labels = labels
+
+	def __enter__(self):
+		self.started = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+class Histogram(Metric):
+	kind = "histogram"
+
+	def __init__(self, name, description, buckets = DEFAULT_BUCKETS):
+		super().__init__(name, description)
+		self.buckets = tuple(sorted(buckets))
+
+	def observe(self, value, **labels):
+		key = self._key(labels)
+		counts = self.values.get(key)
+		if counts is None:
+			counts = self.values[key] = {"buckets": [0] * len(self.buckets), "sum": 0, "count": 0}
+		for i, bound in enumerate(self.buckets):
+			if value <= bound:
+				counts["buckets"][i] += 1
+				break
+		counts["sum"] += value
+		counts["count"] += 1
+
+	def time(self, **labels):
+		# Used as a context manager: with histogram.time(stage = "fetch"): ...
+		return _Timer(self, labels)
+
+	def render(self):
+		lines = ["# HELP %s %s" % (self.name, self.description), "# TYPE %s %s" % (self.name, self.kind)]
+		for labels, counts in self.values.items():
+			cumulative = 0
+			for bound, count in zip(self.buckets, counts["buckets"]):
+				cumulative += count
+				lines.append("%s_bucket%s %s" % (self.name, _format_labels(labels, [("le", bound)]), cumulative))
+			lines.append("%s_bucket%s %s" % (self.name, _format_labels(labels, [("le", "+Inf")]), counts["count"]))
+			lines.append("%s_sum%s %s" % (self.name, _format_labels(labels), counts["sum"]))
+			lines.append("%s_count%s %s" % (self.name, _format_labels(labels), counts["count"]))
+		return lines
+
+	def summarize(self):
+		lines = []
+		for labels, counts in self.values.items():
+			mean = counts["sum"] / counts["count"] * 1000 if counts["count"] else 0
+			lines.append("%s%s: %s observed, %.1f ms on average" % (self.name, _format_labels(labels), counts["count"], mean))
+		return lines
+
+class Registry:
+	"""Holds the bot's metrics, and renders them in Prometheus' text format
+
+	Asking for a metric that already exists returns the existing one, so cogs can simply ask for what they need wherever they need it."""
+
+	def __init__(self):
+		self.metrics = OrderedDict()
+
+	def _get(self, cls, name, description, *args):
+		metric = self.metrics.get(name)
+		if metric is None:
+			metric = self.metrics[name] = cls(name, description, *args)
+		return metric
+
+	def counter(self, name, description):
+		return self._get(Counter, name, description)
+
+	def gauge(self, name, description):
+		return self._get(Gauge, name, description)
+
+	def histogram(self, name, description, buckets = DEFAULT_BUCKETS):
+		return self._get(Histogram, name, description, buckets)
+
+	def render(self):
+		lines = []
+		for metric in self.metrics.values():
+			lines.extend(metric.render())
+		return "\n".join(lines) + "\n"
+
+	def summarize(self):
+		lines = []
+		for metric in self.metrics.values():
+			lines.extend(metric.summarize())
+		return lines
+
+class MetricsServer:
+	# A tiny HTTP server that answers every request with the current metrics, for Prometheus to scrape
+
+	def __init__(self, registry, host = "127.0.0.1", port = 9150):
+		self.registry = registry
+		self.host = host
+		self.port = port
+		self.server = None
+
+	async def start(self):
+		self.server = await asyncio.start_server(self._handle, self.host, self.port)
+
+	async def _handle(self, reader, writer):
+		try:
+			# The request itself does not matter, but it has to be read before answering
+			while True:
+				line = await asyncio.wait_for(reader.readline(), 5)
+				if line in (b"\r\n", b"\n", b""):
+					break
+			body = self.registry.render().encode("utf-8")
+			writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+			await writer.drain()
+		except (asyncio.TimeoutError, ConnectionError):
+			pass
+		finally:
+			writer.close()
+
+	def close(self):
+		if self.server is not None:
+			self.server.close()
+			self.server = None
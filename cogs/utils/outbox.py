@@ -0,0 +1,173 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+try:
+	import aiohttp
+	import discord
+except ImportError:
+	print("Unable to load the outbox. Check your discord.py installation.")
+
+from .dataIO import save_json, load_json
+from .sender import MATCH
+
+RETRY_BASE = 2 # Seconds to wait before retrying a message after a transient failure; doubles with every further failure
+RETRY_MAX = 120
+MAX_ATTEMPTS = 6
+DEAD_LETTER_LIMIT = 100 # Number of undeliverable messages kept on disk for inspection
+SAVE_DELAY = 1
+
+def is_transient(err):
+	# Rate limits, server errors, and failures to get a response at all are worth retrying. Any other error status (such as 400 for a message that is too long) will never go away, so the message is given up on straight away.
+	status = getattr(getattr(err, "response", None), "status", None)
+	return status is None or status == 429 or status >= 500
+
+class Outbox:
+	"""Messages waiting to be posted, kept on disk until they have been delivered
+
+	Each channel has its own queue, which is delivered strictly in order by a single worker. Workers for different channels run concurrently, at most concurrency of them sending at a time.
+	Transient failures are retried with exponential backoff. Messages that Discord rejects for good, such as those to channels that are gone or that the bot may not post in, are dead-lettered."""
+
+	def __init__(self, bot, path, concurrency):
+		self.bot = bot
+		self.path = path
+		self.queues = OrderedDict() # Channel ID -> deque of pending entries
+		self.workers = {}
+		self.waiters = {} # id() of an entry -> future that is resolved once the entry is delivered or given up on
+		self.dead_letters = deque(maxlen = DEAD_LETTER_LIMIT)
+		self.semaphore = asyncio.Semaphore(concurrency)
+		self._save_lock = asyncio.Lock()
+		self._save_handle = None
+		self.idle = asyncio.Event() # Set while there is nothing to deliver, so that less urgent work can wait its turn
+		self.idle.set()
+		self.sent = bot.metrics.counter("announcements_sent_total", "Messages delivered from the outbox")
+		self.failed = bot.metrics.counter("announcements_failed_total", "Messages given up on, by reason")
+		self.retries = bot.metrics.counter("announcement_retries_total", "Transient failures while delivering messages from the outbox")
+		self.delivery_seconds = bot.metrics.histogram("announcement_delivery_seconds", "Time from a message being queued to it being delivered")
+
+	def __len__(self):
+		return sum(len(queue) for queue in self.queues.values())
+
+	def load(self):
+		# Queues up whatever was still waiting to be posted before a restart
+		try:
+			state = load_json(self.path)
+			self.dead_letters.extend(state["dead_letters"])
+			for entry in state["pending"]:
+				self._enqueue(entry)
+		except FileNotFoundError:
+			return
+		except (ValueError, KeyError, TypeError):
+			print("Could not load %s. Messages that were waiting to be posted have been lost." % self.path)
+			return
+
+		if self.bot.settings["verbose"] and len(self) > 0:
+			print("Resuming delivery of %s messages from %s" % (len(self), self.path))
+
+	def _enqueue(self, entry):
+		self.idle.clear()
+		queue = self.queues.setdefault(entry["channel"], deque())
+		queue.append(entry)
+		if entry["channel"] not in self.workers:
+			self.workers[entry["channel"]] = self.bot.loop.create_task(self._work(entry["channel"]))
+
+	async def put(self, messages):
+		# messages is a list of (channel, content) tuples. Returns a future for each message, resolved with None once it is delivered or with the exception that made it undeliverable.
+		# The queue is written to disk before returning, so the messages survive a restart.
+		futures = []
+		for channel, content in messages:
+			entry = {"channel": channel.id, "content": content, "attempts": 0, "queued": time.time()}
+			future = self.bot.loop.create_future()
+			self.waiters[id(entry)] = future
+			futures.append(future)
+			self._enqueue(entry)
+
+		await self.save()
+		return futures
+
+	def _resolve(self, entry, result):
+		future = self.waiters.pop(id(entry), None)
+		if future is not None and not future.done():
+			future.set_result(result)
+
+	def _dead_letter(self, entry, err):
+		self.failed.inc(reason = err.__class__.__name__)
+		self.dead_letters.append({"channel": entry["channel"], "content": entry["content"], "error": repr(err)})
+		self._resolve(entry, err)
+		if self.bot.settings["verbose"]:
+			print("Giving up on a message to channel %s: %r" % (entry["channel"], err))
+
+	async def _work(self, channelid):
+		await self.bot.wait_until_ready()
+		queue = self.queues[channelid]
+		try:
+			while queue:
+				entry = queue[0]
+				channel = self.bot.get_channel(channelid)
+				if channel is None:
+					# The channel is gone, so nothing else queued for it can be delivered either
+					while queue:
+						self._dead_letter(queue.popleft(), discord.InvalidArgument("Channel %s not found" % channelid))
+					break
+
+				try:
+					async with self.semaphore:
+						await self.bot.send_message(channel, entry["content"], priority = MATCH)
+				except (discord.Forbidden, discord.NotFound, discord.InvalidArgument) as err:
+					self._dead_letter(entry, err)
+				except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as err:
+					if is_transient(err):
+						self.retries.inc()
+						entry["attempts"] += 1
+						if entry["attempts"] < MAX_ATTEMPTS:
+							await asyncio.sleep(min(RETRY_MAX, RETRY_BASE * 2 ** (entry["attempts"] - 1)))
+							continue # Retry the same message, so that later ones stay behind it
+					self._dead_letter(entry, err)
+				else:
+					self.sent.inc()
+					if "queued" in entry:
+						self.delivery_seconds.observe(time.time() - entry["queued"])
+					self._resolve(entry, None)
+
+				queue.popleft()
+				self.schedule_save()
+		finally:
+			del self.workers[channelid]
+			if queue:
+				# Stopped early (the cog was unloaded); the remaining messages stay on disk for next time
+				self.schedule_save()
+			else:
+				del self.queues[channelid]
+				self.schedule_save()
+				if not self.queues:
+					self.idle.set()
+
+	async def wait_idle(self):
+		await self.idle.wait()
+
+	def _snapshot(self):
+		pending = [dict(entry) for queue in self.queues.values() for entry in queue]
+		return {"pending": pending, "dead_letters": list(self.dead_letters)}
+
+	async def save(self):
+		if self._save_handle is not None:
+			self._save_handle.cancel()
+			self._save_handle = None
+		async with self._save_lock:
+			try:
+				await self.bot.loop.run_in_executor(None, save_json, self.path, self._snapshot())
+			except OSError as err:
+				print("Unable to save pending messages: %s" % err)
+
+	def schedule_save(self):
+		# Deliveries are saved in batches. Should the bot crash in between, a few messages may be posted twice, but none are lost.
+		if self._save_handle is None:
+			self._save_handle = self.bot.loop.call_later(SAVE_DELAY, self._start_save)
+
+	def _start_save(self):
+		self._save_handle = None
+		self.bot.loop.create_task(self.save())
+
+	def stop(self):
+		for worker in list(self.workers.values()):
+			worker.cancel()
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+
+# Kinds of announcement that servers can subscribe to through their settings. Each rendering of a match event has one variant per kind it concerns.
+MATCH_START = "match start"
+VICTORY_WITH_RESULT = "victory with result"
+VICTORY_WITHOUT_RESULT = "victory without result"
+RENDER_CACHE_SIZE = 256
+
+def describe_series(seriestype, gameno):
+	if seriestype == 0:
+		return "Best of 1"
+	elif seriestype == 1:
+		return "Game %s of 3" % gameno
+	elif seriestype == 2:
+		return "Game %s of 5" % gameno
+	else:
+		return "unknown series type %s" % seriestype # I don't think this is possible
+
+def describe_duration(duration):
+	m, s = divmod(duration, 60)
+	min_string = "1 minute" if m == 1 else "%s minutes" % m
+
+	if s == 0:
+		sec_string = ""
+	elif s == 1:
+		sec_string = " and 1 second"
+	else:
+		sec_string = " and %s seconds" % s
+	return min_string + sec_string
+
+class AnnouncementRenderer:
+	"""Formats the announcements for match events
+
+	Every variant of an announcement is formatted at once, and the result is kept per match, so announcing to any number of servers (or announcing the same match again) only looks the text up.
+	get_league_name maps a league ID to its name, or to None if the name is not known."""
+
+	def __init__(self, get_league_name, size = RENDER_CACHE_SIZE):
+		self.get_league_name = get_league_name
+		self.size = size
+		self.rendered = OrderedDict() # (match ID, kind of event) -> variants, least recently used first
+
+	def _cached(self, key, render):
+		variants = self.rendered.get(key)
+		if variants is None:
+			variants = self.rendered[key] = render()
+			while len(self.rendered) > self.size:
+				self.rendered.popitem(last = False)
+		else:
+			self.rendered.move_to_end(key)
+		return variants
+
+	def render_start(self, match):
+		# Returns an OrderedDict mapping the kinds of announcement to their text
+		return self._cached((match.matchid, MATCH_START), lambda: self._render_start(match))
+
+	def _render_start(self, match):
+		series_desc = describe_series(match.seriestype, match.gameno)
+		league = self.get_league_name(match.league_id)
+		if league is not None:
+			series_desc = "%s, %s" % (league, series_desc)
+		return OrderedDict([(MATCH_START, "The draft for %s vs. %s is now underway (%s)." % (match.radiant_team, match.dire_team, series_desc))])
+
+	def render_results(self, match, game):
+		# Not to be confused with show_result, the option for toggling whether the bot reveals the winner, duration, and kill score at the end. Both variants are rendered here.
+		return self._cached((match.matchid, VICTORY_WITH_RESULT), lambda: self._render_results(match, game))
+
+	def _render_results(self, match, game):
+		matchid = match.matchid
+		series_string = "" if match.seriestype == 0 else "Game %s of " % match.gameno
+		winner = match.radiant_team if game["radiant_win"] else match.dire_team
+		score = "%s-%s" % (game["radiant_score"], game["dire_score"])
+
+		msg_winner = "%s%s vs. %s has ended in %s victory, %s in. The final score was %s. Dotabuff: <https://www.dotabuff.com/matches/%s>" % (series_string, match.radiant_team, match.dire_team, winner, describe_duration(game["duration"]), score, matchid)
+		msg_no_winner = "%s%s vs. %s has ended. Dotabuff: <https://www.dotabuff.com/matches/%s>" % (series_string, match.radiant_team, match.dire_team, matchid)
+		return OrderedDict([(VICTORY_WITH_RESULT, msg_winner), (VICTORY_WITHOUT_RESULT, msg_no_winner)])
+
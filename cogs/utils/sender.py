@@ -0,0 +1,148 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+# Priority classes for everything the bot sends to Discord, most urgent first
+MATCH = 0
+COMMAND = 1
+WELCOME = 2
+NICKNAME = 3
+PRIORITY_NAMES = ("match", "command", "welcome", "nickname")
+# Requests allowed per number of seconds on each kind of route, as documented by Discord. A route is one kind of request to one channel or server.
+ROUTE_LIMITS = {"message": (5, 5), "nickname": (1, 1)}
+DEFAULT_ROUTE_LIMIT = (5, 5)
+
+class RouteLimit:
+	# Token bucket for a single route. Unlike the RateLimiter used for Valve's API, it never waits itself, so one busy route cannot hold up the others.
+
+	def __init__(self, requests, per, now):
+		self.capacity = requests
+		self.rate = requests / per
+		self.tokens = requests
+		self.updated = now
+
+	def get_wait(self, now):
+		# Returns the number of seconds until a request may be sent on this route
+		if now > self.updated:
+			self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+			self.updated = now
+		if self.tokens >= 1:
+			return 0
+		return max(0, self.updated - now) + (1 - self.tokens) / self.rate
+
+	def spend(self):
+		self.tokens -= 1
+
+	def block(self, seconds, now):
+		# Used when Discord says the route is rate limited after all
+		self.tokens = 0
+		self.updated = max(self.updated, now + seconds)
+
+class _Job:
+	__slots__ = ("route", "call", "future", "queued", "priority")
+
+	def __init__(self, priority, route, call, future):
+		self.priority = priority
+		self.route = route
+		self.call = call
+		self.future = future
+		self.queued = time.perf_counter()
+
+class SendScheduler:
+	"""Sends everything the bot sends to Discord, most urgent first
+
+	Requests are queued by priority class, and within a class by server, taking turns between servers so that a flood in one of them does not hold up the rest.
+	Each route has its own rate limit, and a request whose route is at its limit is passed over for the next one that can go, rather than keeping the others waiting.
+	At most concurrency requests are in flight at a time."""
+
+	def __init__(self, loop, concurrency = 10, metrics = None):
+		self.loop = loop
+		self.concurrency = concurrency
+		self.classes = [OrderedDict() for _ in PRIORITY_NAMES] # Server ID (None outside servers) -> deque of jobs
+		self.routes = {}
+		self.workers = []
+		self.wakeup = asyncio.Event()
+		self.sent = metrics.counter("discord_requests_total", "Requests sent to Discord, by priority class") if metrics else None
+		self.wait_seconds = metrics.histogram("discord_request_wait_seconds", "Time requests to Discord spent waiting their turn, by priority class") if metrics else None
+
+	def __len__(self):
+		return sum(len(queue) for queues in self.classes for queue in queues.values())
+
+	def _get_route(self, route, now):
+		limit = self.routes.get(route)
+		if limit is None:
+			limit = self.routes[route] = RouteLimit(*ROUTE_LIMITS.get(route[0], DEFAULT_ROUTE_LIMIT), now = now)
+		return limit
+
+	async def submit(self, priority, route, server, call):
+		# route is a (kind, ID) tuple such as ("message", channel ID), and call a function returning the coroutine that makes the request. Returns whatever the request returns.
+		if not self.workers:
+			self.workers = [self.loop.create_task(self._work()) for _ in range(self.concurrency)]
+		future = self.loop.create_future()
+		self.classes[priority].setdefault(server, deque()).append(_Job(priority, route, call, future))
+		self.wakeup.set()
+		return await future
+
+	def _next_job(self):
+		# Returns the next job that may be sent, or None and the number of seconds until one may be (None if there is nothing to send)
+		now = self.loop.time()
+		soonest = None
+		for queues in self.classes:
+			for _ in range(len(queues)):
+				# Every server looked at is either removed or moved to the back, so the front is always the next one to look at
+				server = next(iter(queues))
+				queue = queues[server]
+				while queue and queue[0].future.done():
+					queue.popleft() # Given up on by whoever submitted it
+				if not queue:
+					del queues[server]
+					continue
+
+				job = queue[0]
+				limit = self._get_route(job.route, now)
+				wait = limit.get_wait(now)
+				queues.move_to_end(server) # Whether it goes now or has to wait, this server has had its turn
+				if wait > 0:
+					soonest = wait if soonest is None else min(soonest, wait)
+					continue
+
+				limit.spend()
+				queue.popleft()
+				if not queue:
+					del queues[server]
+				return job, None
+		return None, soonest
+
+	async def _work(self):
+		while True:
+			job, wait = self._next_job()
+			if job is None:
+				self.wakeup.clear()
+				try:
+					await asyncio.wait_for(self.wakeup.wait(), wait)
+				except asyncio.TimeoutError:
+					pass
+				continue
+
+			if self.sent is not None:
+				self.sent.inc(priority = PRIORITY_NAMES[job.priority])
+				self.wait_seconds.observe(time.perf_counter() - job.queued, priority = PRIORITY_NAMES[job.priority])
+			try:
+				result = await job.call()
+			except asyncio.CancelledError:
+				raise
+			except Exception as err:
+				response = getattr(err, "response", None)
+				if getattr(response, "status", None) == 429:
+					retry_after = getattr(err, "retry_after", None) or 1
+					self._get_route(job.route, self.loop.time()).block(retry_after, self.loop.time())
+				if not job.future.done():
+					job.future.set_exception(err)
+			else:
+				if not job.future.done():
+					job.future.set_result(result)
+
+	def stop(self):
+		for worker in self.workers:
+			worker.cancel()
+		self.workers = []
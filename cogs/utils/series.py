@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+
+from .livegames import get_wins_needed
+
+SERIES_IDLE_EXPIRY = 6 * 3600 # Series with no new games for this many seconds are forgotten, finished or not
+SERIES_FINISHED_EXPIRY = 3600 # Finished series are kept this long, so that lobbies lingering after the deciding game are still recognised
+SERIES_LIMIT = 1000
+
+def get_series_key(league_id, team_id, other_team_id, seriestype):
+	# Teams swap sides between games, so the key does not depend on which of them is Radiant. Returns None if either team is unknown, as a series cannot be told apart from others then.
+	if not league_id or not team_id or not other_team_id:
+		return None
+	return (league_id, min(team_id, other_team_id), max(team_id, other_team_id), seriestype)
+
+class Series:
+	__slots__ = ("key", "wins", "games", "updated", "finished", "played")
+
+	def __init__(self, key, wins = None, games = None, updated = 0, finished = None, played = None):
+		self.key = key
+		self.wins = wins if wins is not None else {} # Team ID -> games won
+		self.games = games if games is not None else {} # Game number -> ID of the match counted as that game
+		self.updated = updated
+		self.finished = finished # Time the series was decided, or None
+		self.played = played if played is not None else set() # IDs of the matches whose results have been counted
+
+	def to_dict(self):
+		return {"key": list(self.key), "wins": [[team, wins] for team, wins in self.wins.items()], "games": [[gameno, matchid] for gameno, matchid in self.games.items()],
+			"updated": self.updated, "finished": self.finished, "played": sorted(self.played)}
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(tuple(data["key"]), dict((team, wins) for team, wins in data["wins"]), dict((gameno, matchid) for gameno, matchid in data["games"]), data["updated"], data["finished"],
+			set(data.get("played", [])))
+
+class SeriesIndex:
+	"""Keeps track of series across all of their games, keyed by league, teams and series type
+
+	Each game number of a series is claimed by the first match seen for it, so a lobby that is hosted again for the same game is recognised as a duplicate in constant time, even after the original has finished.
+	Once a series has been decided, a game that has been played no longer blocks later matches, and a match between the same teams starting from 0-0 begins a new series (such as a tiebreaker or a rematch).
+	Series are forgotten a while after they are decided or once they have gone quiet, and at most SERIES_LIMIT are kept."""
+
+	def __init__(self):
+		self.series = OrderedDict() # Least recently updated first
+
+	def __len__(self):
+		return len(self.series)
+
+	def get(self, key):
+		return self.series.get(key)
+
+	def _touch(self, series, now):
+		series.updated = now
+		self.series.move_to_end(series.key)
+
+	def claim(self, key, gameno, matchid, wins, now = None):
+		# Records that matchid is being played as game gameno of the series, with wins mapping team IDs to the series score the match started at. Returns False if another match already holds that game.
+		now = time.time() if now is None else now
+		series = self.series.get(key)
+		if series is not None and series.finished is not None and not any(wins.values()):
+			del self.series[key]
+			series = None
+		if series is None:
+			series = self.series[key] = Series(key)
+		self._touch(series, now)
+		for team, won in wins.items():
+			series.wins[team] = max(series.wins.get(team, 0), won)
+
+		holder = series.games.setdefault(gameno, matchid)
+		if holder != matchid and series.finished is not None and holder in series.played:
+			holder = series.games[gameno] = matchid
+		if len(self.series) > SERIES_LIMIT:
+			self.series.popitem(last = False)
+		return holder == matchid
+
+	def record_result(self, key, matchid, winner, now = None):
+		# Counts a win in match matchid for the team with the ID winner. Returns the series, or None if it is not being kept track of.
+		now = time.time() if now is None else now
+		series = self.series.get(key)
+		if series is None or matchid in series.played:
+			return series
+		self._touch(series, now)
+		series.played.add(matchid)
+		series.wins[winner] = series.wins.get(winner, 0) + 1
+		needed = get_wins_needed(key[3])
+		if needed is not None and series.wins[winner] >= needed and series.finished is None:
+			series.finished = now
+		return series
+
+	def expire(self, now = None):
+		now = time.time() if now is None else now
+		for key in list(self.series):
+			series = self.series[key]
+			if series.updated < now - SERIES_IDLE_EXPIRY:
+				del self.series[key]
+			elif series.finished is not None and series.finished < now - SERIES_FINISHED_EXPIRY:
+				del self.series[key]
+
+	def to_list(self):
+		return [series.to_dict() for series in self.series.values()]
+
+	def load(self, data):
+		self.series.clear()
+		for item in data:
+			series = Series.from_dict(item)
+			self.series[series.key] = series
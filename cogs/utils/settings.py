@@ -0,0 +1,63 @@
+import json
+
+SETTINGS_FILE = "data/settings.json"
+BOT_DEFAULTS = {
+	"token": "",
+	"prefix": ";",
+	"owner": "",
+	"changenick_interval": 3600,
+	"welcome_batch_window": 10,
+	"welcome_batch_max_delay": 60,
+	"api_interval": 20,
+	"api_interval_fast": 10,
+	"api_interval_idle": 60,
+	"api_timeout": 10,
+	"api_rate_limit": 1,
+	"api_burst": 3,
+	"detail_concurrency": 4,
+	"details_retry_interval": 30,
+	"announce_concurrency": 10,
+	"send_concurrency": 10,
+	"apikey": "",
+	"filter_matches": True,
+	"notable_leagues": [5401],
+	"filter_generic": True,
+	"no_repeat_matches": True,
+	"save_match_data": False,
+	"metrics_host": "127.0.0.1",
+	"metrics_port": 0,
+	"shard_count": 1,
+	"feed_host": "127.0.0.1",
+	"feed_port": 9151,
+	"feed_path": "",
+	"collector": False,
+	"event_log": False,
+	"verbose": True
+}
+SERVER_DEFAULTS = {
+	"welcome_channel": "",
+	"matches_channel": "",
+	"welcome_messages": False,
+	"victory_messages": True,
+	"show_result": True,
+	"auto_change_nick": False
+}
+
+def load_settings(path = SETTINGS_FILE):
+	# Reads settings.json, filling in the defaults for anything it leaves out. Shared by the bot and the standalone collector.
+	settings = {}
+	try:
+		with open(path) as json_data:
+			file = json.load(json_data)
+			for key in BOT_DEFAULTS:
+				if key in file:
+					settings[key] = file[key]
+				else:
+					settings[key] = BOT_DEFAULTS[key]
+	except FileNotFoundError:
+		print("You need to create a file named settings.json in the data folder (if there is none, create one). Please see the README for more information.")
+		raise SystemExit
+	except json.decoder.JSONDecodeError:
+		print("Could not load settings.json. Please make sure the syntax is correct.")
+		raise SystemExit
+	return settings
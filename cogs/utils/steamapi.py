@@ -0,0 +1,227 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+
+try:
+	import aiohttp
+except ImportError:
+	print("Unable to load the Steam API client. Check your aiohttp installation (it should come with discord.py).")
+
+API_BASE_URL = "https://api.steampowered.com/"
+LIVE_LEAGUE_GAMES = "IDOTA2Match_570/GetLiveLeagueGames/v0001/"
+MATCH_DETAILS = "IDOTA2Match_570/GetMatchDetails/V001/"
+LEAGUE_LISTING = "IDOTA2Match_570/GetLeagueListing/v0001/"
+BACKOFF_BASE = 2 # Seconds to back off after the first failure; doubles with every further failure in a row
+BACKOFF_MAX = 300
+
+def parse_retry_after(value):
+	# Valve sends Retry-After as a number of seconds. The HTTP-date form is not worth supporting here.
+	try:
+		return max(0, int(value))
+	except (TypeError, ValueError):
+		return None
+
+class SteamAPIError(Exception):
+	def __init__(self, endpoint, status = None, reason = "", retry_after = None):
+		self.endpoint = endpoint
+		self.status = status # None if the request never got a response (timeout, connection error)
+		self.reason = reason
+		self.retry_after = retry_after
+		if status is None:
+			super().__init__("Request to %s failed: %s" % (endpoint, reason))
+		else:
+			super().__init__("Request to %s failed with status %s: %s" % (endpoint, status, reason))
+
+	@property
+	def transient(self):
+		# Whether Valve is asking us to slow down or is having trouble, as opposed to rejecting the request itself
+		return self.status == 429 or (self.status is not None and self.status >= 500)
+
+class RateLimiter:
+	"""Token bucket that spaces out requests to Valve's API
+
+	Holds up to capacity tokens and regains rate tokens per second. Each request spends one token, waiting for the bucket to refill if it is empty.
+	After Valve signals trouble, the bucket is emptied and stops refilling for an exponentially growing, jittered delay."""
+
+	def __init__(self, rate, capacity = 1, loop = None):
+		self.rate = rate
+		self.capacity = capacity
+		self.loop = loop if loop is not None else asyncio.get_event_loop()
+		self.tokens = capacity
+		self.updated = self.loop.time() # Refilling starts from here; lies in the future while backing off
+		self.failures = 0
+		self._lock = asyncio.Lock()
+
+	def _refill(self):
+		now = self.loop.time()
+		if now > self.updated:
+			self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+			self.updated = now
+
+	async def acquire(self):
+		# The lock makes waiters take their tokens in the order they arrived
+		async with self._lock:
+			self._refill()
+			while self.tokens < 1:
+				paused = max(0, self.updated - self.loop.time())
+				await asyncio.sleep(paused + (1 - self.tokens) / self.rate)
+				self._refill()
+			self.tokens -= 1
+
+	def back_off(self, retry_after = None):
+		# Returns the number of seconds before requests may resume. Never resumes sooner than Valve's Retry-After asks for.
+		self.failures += 1
+		delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1))
+		delay = random.uniform(delay / 2, delay)
+		if retry_after is not None:
+			delay = max(delay, retry_after)
+
+		self.tokens = 0
+		self.updated = max(self.updated, self.loop.time() + delay)
+		return delay
+
+	def reset_backoff(self):
+		self.failures = 0
+
+class PollScheduler:
+	"""Decides how long to wait between polls of GetLiveLeagueGames
+
+	Owns the rate limiter shared by every request to Valve's API. Polls faster while tracked matches look close to ending and slower while nothing of interest is live."""
+
+	def __init__(self, interval, fast_interval, idle_interval, rate, capacity = 1, loop = None):
+		self.normal_interval = interval
+		self.fast_interval = fast_interval
+		self.idle_interval = idle_interval
+		self.limiter = RateLimiter(rate, capacity, loop = loop)
+		self.interval = interval
+
+	def update(self, live, ending):
+		# live: whether any matches are being tracked; ending: whether any of them look like they are about to finish
+		if ending:
+			self.interval = self.fast_interval
+		elif live:
+			self.interval = self.normal_interval
+		else:
+			self.interval = self.idle_interval
+		return self.interval
+
+	async def wait(self):
+		await asyncio.sleep(self.interval)
+
+def is_match_complete(details):
+	# It seems that sometimes a match disappears from the GetLiveLeagueGames listing before GetMatchDetails has its result
+	return "radiant_win" in details and "duration" in details
+
+class MatchDetailsCache:
+	"""Results of GetMatchDetails calls, keyed by match ID
+
+	Results for completed matches never change, so they are kept until the least recently used ones have to make room. Results for incomplete matches are only kept for negative_ttl seconds, so that a match which is still pending is not requested on every poll.
+	Hits and misses are counted in metrics (a Registry), if given."""
+
+	def __init__(self, size = 256, negative_ttl = 30, loop = None, metrics = None):
+		self.size = size
+		self.negative_ttl = negative_ttl
+		self.loop = loop if loop is not None else asyncio.get_event_loop()
+		self.entries = OrderedDict() # Match ID -> (details, expiry time or None)
+		self.hits = 0
+		self.misses = 0
+		self.lookups = metrics.counter("steam_details_cache_lookups_total", "Lookups in the cache of GetMatchDetails results, by result (hit or miss)") if metrics else None
+		self.cached = metrics.gauge("steam_details_cache_entries", "Results held in the cache of GetMatchDetails results") if metrics else None
+
+	def __len__(self):
+		return len(self.entries)
+
+	def get(self, matchid):
+		# Returns the cached details, or None if they have to be requested
+		entry = self.entries.get(matchid)
+		if entry is not None and (entry[1] is None or entry[1] > self.loop.time()):
+			self.entries.move_to_end(matchid)
+			self.hits += 1
+			if self.lookups is not None:
+				self.lookups.inc(result = "hit")
+			return entry[0]
+
+		if entry is not None:
+			del self.entries[matchid]
+		self.misses += 1
+		if self.lookups is not None:
+			self.lookups.inc(result = "miss")
+		return None
+
+	def put(self, matchid, details):
+		expiry = None if is_match_complete(details) else self.loop.time() + self.negative_ttl
+		self.entries[matchid] = (details, expiry)
+		self.entries.move_to_end(matchid)
+		while len(self.entries) > self.size:
+			self.entries.popitem(last = False)
+		if self.cached is not None:
+			self.cached.set(len(self.entries))
+
+	def get_stats(self):
+		return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+class SteamAPI:
+	"""Asynchronous client for Valve's Web API
+
+	All requests share a single keep-alive session, so the connection to Valve is reused between polls instead of being set up every time."""
+
+	def __init__(self, apikey, loop = None, base_url = API_BASE_URL, timeout = 10, max_connections = 4, rate_limiter = None, recorder = None):
+		self.apikey = apikey
+		self.loop = loop if loop is not None else asyncio.get_event_loop()
+		self.rate_limiter = rate_limiter
+		self.recorder = recorder # Something with a record(timestamp, endpoint, params, status, body) method, such as a CaptureWriter
+		self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+		self.timeout = timeout
+		self.max_connections = max_connections
+		self._session = None
+
+	@property
+	def session(self):
+		# Created lazily, since the session has to be made on the loop it will be used from
+		if self._session is None or self._session.closed:
+			connector = aiohttp.TCPConnector(loop = self.loop, limit = self.max_connections)
+			self._session = aiohttp.ClientSession(loop = self.loop, connector = connector)
+		return self._session
+
+	async def _fetch(self, url, params):
+		async with self.session.get(url, params = params) as response:
+			body = await response.read()
+			return response.status, response.reason, response.headers.get("Retry-After"), body
+
+	async def request(self, endpoint, **params):
+		# Returns the body of the response as text. Cancelling the calling task cancels the request and releases its connection.
+		recorded_params = dict(params)
+		params["key"] = self.apikey
+		url = self.base_url + endpoint
+		if self.rate_limiter is not None:
+			await self.rate_limiter.acquire()
+
+		try:
+			status, reason, retry_after, body = await asyncio.wait_for(self._fetch(url, params), self.timeout)
+		except asyncio.TimeoutError:
+			raise SteamAPIError(endpoint, reason = "timed out after %s seconds" % self.timeout)
+		except aiohttp.ClientError as err:
+			raise SteamAPIError(endpoint, reason = str(err) or err.__class__.__name__)
+
+		text = body.decode("utf-8", "replace")
+		if self.recorder is not None:
+			self.loop.run_in_executor(None, self.recorder.record, time.time(), endpoint, recorded_params, status, text)
+
+		if status != 200:
+			err = SteamAPIError(endpoint, status, reason, parse_retry_after(retry_after))
+			if err.transient and self.rate_limiter is not None:
+				self.rate_limiter.back_off(err.retry_after)
+			raise err
+
+		if self.rate_limiter is not None:
+			self.rate_limiter.reset_backoff()
+
+		return text
+
+	async def close(self):
+		if self._session is not None and not self._session.closed:
+			closing = self._session.close()
+			if closing is not None: # Only a coroutine in newer versions of aiohttp
+				await closing
+		self._session = None
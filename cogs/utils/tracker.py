@@ -0,0 +1,490 @@
+import asyncio
+import json
+import time
+import traceback
+from collections import OrderedDict
+from json.decoder import JSONDecodeError
+
+from .steamapi import SteamAPI, SteamAPIError, PollScheduler, MatchDetailsCache, is_match_complete, LIVE_LEAGUE_GAMES, MATCH_DETAILS
+from .dataIO import save_json, load_json
+from .capture import CaptureWriter
+from .series import SeriesIndex, get_series_key
+from .metadata import MetadataCache
+from .livegames import DRAFT, IN_PROGRESS, DISAPPEARED, get_game_state, get_kill_score, is_series_point, diff_snapshots, parse_live_league_games
+
+MATCH_STATE_FILE = "data/match_state.json"
+CAPTURE_DIRECTORY = "data/captures"
+FINISHED_HISTORY = 500 # Number of finished match IDs to remember, so that matches which linger in the live listing are not announced again
+NEAR_END_DURATION = 1800 # Games that have gone on for this many seconds could end at any moment, so the tracker polls faster while they are tracked
+RESULT_WAIT = 900 # Seconds after a match disappears from the live listing during which its result is expected soon, so the tracker polls faster and asks for it every details_retry_interval
+STALE_RETRY_INTERVAL = 1800 # A match still without a result after RESULT_WAIT is most likely a lobby that will never finish, so its details are only requested this often
+RESULT_FIELDS = ("match_id", "radiant_win", "duration", "radiant_score", "dire_score", "radiant_name", "dire_name") # The parts of a match's details that finished events carry
+# Kinds of event published by the tracker. Apart from the snapshot, each is about one match, and goes with a change in its state or score.
+SNAPSHOT = "snapshot"
+MATCH_STARTED = "match_started" # The draft has begun
+GAME_STARTED = "game_started" # The draft is over and the game itself is underway
+SCORE_CHANGED = "score_changed" # The kill score has changed
+SERIES_POINT = "series_point" # The match has started, and its winner could take the series
+MATCH_FINISHED = "match_finished"
+MATCH_EVENTS = (MATCH_STARTED, GAME_STARTED, SCORE_CHANGED, SERIES_POINT, MATCH_FINISHED)
+
+class Match:
+	__slots__ = ("matchid", "radiant_team", "dire_team", "gameno", "seriestype", "state", "radiant_score", "dire_score", "radiant_wins", "dire_wins", "league_id", "radiant_id", "dire_id", "announced")
+
+	def __init__(self, matchid, radiant_team, dire_team, gameno, seriestype, state = DRAFT, radiant_score = 0, dire_score = 0, radiant_wins = 0, dire_wins = 0, league_id = None, radiant_id = None, dire_id = None, announced = True):
+		self.matchid = matchid
+		self.radiant_team = radiant_team
+		self.dire_team = dire_team
+		self.gameno = gameno
+		self.seriestype = seriestype
+		self.state = state
+		self.radiant_score = radiant_score # Kill score
+		self.dire_score = dire_score
+		self.radiant_wins = radiant_wins # Games won earlier in the series
+		self.dire_wins = dire_wins
+		self.league_id = league_id
+		self.radiant_id = radiant_id # Team IDs, or None for teams without one
+		self.dire_id = dire_id
+		self.announced = announced # False for a lobby hosted again for a game already being tracked, which nobody needs to hear more about
+
+	def to_dict(self):
+		return {attr: getattr(self, attr) for attr in self.__slots__}
+
+	@property
+	def series_key(self):
+		return get_series_key(self.league_id, self.radiant_id, self.dire_id, self.seriestype)
+
+	@property
+	def details(self):
+		# No need to include the series type, as the participating teams and game number should be unique enough
+		return (self.radiant_team, self.dire_team, self.gameno)
+
+class MatchList:
+	# Matches are kept in the order they were added, keyed by match ID. A second index groups them by their details, so that duplicates can be found without scanning the whole list.
+	# version goes up whenever a match is added or removed, so that anything worked out from the list can tell when it is out of date.
+
+	def __init__(self, original = None):
+		self.matches = OrderedDict()
+		self.by_details = {}
+		self.version = 0
+		if original is not None:
+			for original_match in original:
+				self._add(original_match)
+
+	def _add(self, match):
+		if match.matchid in self.matches:
+			self._discard(match.matchid)
+		self.matches[match.matchid] = match
+		self.by_details.setdefault(match.details, set()).add(match.matchid)
+		self.version += 1
+
+	def _discard(self, matchid):
+		match = self.matches.pop(matchid)
+		same_details = self.by_details[match.details]
+		same_details.discard(matchid)
+		if not same_details:
+			del self.by_details[match.details]
+		self.version += 1
+		return match
+
+	def __len__(self):
+		return len(self.matches)
+
+	def __getitem__(self, key):
+		if not isinstance(key, int):
+			raise TypeError
+		if key >= len(self.matches):
+			raise IndexError
+		return list(self.matches.values())[key]
+
+	def __delitem__(self, key):
+		self._discard(self[key].matchid)
+
+	def __iter__(self):
+		return iter(self.matches.values())
+
+	def __contains__(self, matchid):
+		return matchid in self.matches
+
+	def append(self, matchid, radiant_team, dire_team, gameno, seriestype, state = DRAFT, **progress):
+		# progress holds any of the scores and IDs kept by Match
+		self._add(Match(matchid, radiant_team, dire_team, gameno, seriestype, state, **progress))
+
+	def get_states(self):
+		return OrderedDict((matchid, match.state) for matchid, match in self.matches.items())
+
+	def remove(self, matchid):
+		if matchid not in self.matches:
+			raise KeyError(matchid)
+		self._discard(matchid)
+
+	def clear(self):
+		self.matches.clear()
+		self.by_details.clear()
+		self.version += 1
+
+	def get_match_by_id(self, matchid):
+		return self.matches.get(matchid)
+
+	def match_exists_with_details(self, radiant_team, dire_team, gameno):
+		return (radiant_team, dire_team, gameno) in self.by_details
+
+	def purge_duplicates(self, matchid):
+		# Returns the IDs of the matches that were removed
+		match = self.matches[matchid]
+		duplicates = [duplicate for duplicate in self.by_details[match.details] if duplicate != matchid]
+		for duplicate in duplicates:
+			self._discard(duplicate)
+		return duplicates
+
+	def apply(self, event):
+		# Follows the events published by a tracker elsewhere, so that this list ends up holding the same matches as the tracker's
+		if event["type"] == SNAPSHOT:
+			self.clear()
+			for match in event["matches"]:
+				self.append(**match)
+		elif event["type"] == MATCH_FINISHED:
+			for matchid in [event["match"]["matchid"]] + event["duplicates"]:
+				if matchid in self.matches:
+					self._discard(matchid)
+		elif event["type"] in MATCH_EVENTS:
+			match = self.matches.get(event["match"]["matchid"])
+			if match is None:
+				self.append(**event["match"])
+			else:
+				# Updated in place, so that the match keeps its place in the list
+				for attr, value in event["match"].items():
+					setattr(match, attr, value)
+
+def get_names_from_league_game(game, get_team_name = None):
+	# Gets team names from a game provided by a GetLiveLeagueGames call. A team that turns up without its name is looked up with get_team_name (if given) by its ID. If a team has no name, it is "Radiant" or "Dire".
+	radiant_name = dire_name = None
+	if "radiant_team" in game:
+		radiant_name = game["radiant_team"].get("team_name")
+		if not radiant_name and get_team_name is not None:
+			radiant_name = get_team_name(game["radiant_team"].get("team_id"))
+
+	if "dire_team" in game:
+		dire_name = game["dire_team"].get("team_name")
+		if not dire_name and get_team_name is not None:
+			dire_name = get_team_name(game["dire_team"].get("team_id"))
+
+	return (radiant_name or "Radiant", dire_name or "Dire")
+
+def get_names_from_match_details(game):
+	# Gets team names from a game provided by a GetMatchDetails call. If a team has no name, it is "Radiant" or "Dire".
+	if "radiant_name" in game:
+		radiant_name = game["radiant_name"]
+	else:
+		radiant_name = "Radiant"
+
+	if "dire_name" in game:
+		dire_name = game["dire_name"]
+	else:
+		dire_name = "Dire"
+
+	return (radiant_name, dire_name)
+
+def get_gameno_from_match_details(game):
+	# I don't know if Valve's API ever returns a match without radiant_score and dire_score fields
+	return game["radiant_score"] + game["dire_score"] + 1
+
+class MatchTracker:
+	"""Polls Valve's API for notable matches and follows them until they finish, without any knowledge of Discord
+
+	Whatever happens to a tracked match is published to every coroutine in listeners as an event: a dict with a "type", the "time" and the match as a dict, so that it can just as well be sent to another process as JSON.
+	A match_started event says whether the match should be announced, which it should not be if it repeats an earlier one. Matches that are not announced get no game_started, score_changed or series_point events either. A match_finished event carries the result, and the IDs of duplicates that were dropped along with it."""
+
+	def __init__(self, settings, loop, metrics):
+		self.settings = settings
+		self.loop = loop
+		self.scheduler = PollScheduler(settings["api_interval"], settings["api_interval_fast"], settings["api_interval_idle"],
+			settings["api_rate_limit"], settings["api_burst"], loop = loop)
+		recorder = CaptureWriter(CAPTURE_DIRECTORY) if settings["save_match_data"] else None
+		self.api = SteamAPI(settings["apikey"], loop = loop, timeout = settings["api_timeout"],
+			max_connections = settings["detail_concurrency"] + 1, rate_limiter = self.scheduler.limiter, recorder = recorder)
+		self.details_cache = MatchDetailsCache(negative_ttl = settings["details_retry_interval"], loop = loop, metrics = metrics)
+		self.matches = MatchList()
+		self.finished_ids = OrderedDict()
+		self.vanished = {} # Match ID -> [when it disappeared from the live listing, when its details are next due], for matches waiting for their result
+		self.saved_state = None
+		self.series = SeriesIndex()
+		self.metadata = MetadataCache(loop, request = self.make_request, verbose = settings["verbose"])
+		self.listeners = []
+		self.stage_seconds = metrics.histogram("dota_poll_stage_seconds", "Time spent in each stage of a poll of Valve's API")
+		self.api_requests = metrics.counter("steam_api_requests_total", "Requests made to Valve's API")
+		self.api_errors = metrics.counter("steam_api_errors_total", "Failed requests to Valve's API, by status (none if there was no response)")
+		self.tracked_matches = metrics.gauge("dota_tracked_matches", "Matches currently being tracked")
+
+	async def close(self):
+		await self.api.close()
+
+	def get_snapshot(self):
+		return {"type": SNAPSHOT, "time": time.time(), "matches": [match.to_dict() for match in self.matches]}
+
+	async def publish(self, event):
+		event["time"] = time.time()
+		for listener in list(self.listeners):
+			try:
+				await listener(event)
+			except Exception as err:
+				# One listener failing should neither keep the event from the others nor stop the polling
+				print("Unable to handle a %s event: %r" % (event["type"], err))
+
+	def advance(self, match, game, transition):
+		# Moves a match on to what the latest listing says about it, returning the kinds of event that follow. transition is the match's old and new states from the diff of the listings, or None if its state is unchanged.
+		events = []
+		if transition is not None:
+			old_state, match.state = transition
+			if match.state == IN_PROGRESS and old_state in (None, DRAFT):
+				events.append(GAME_STARTED)
+
+		score = get_kill_score(game)
+		if score != (match.radiant_score, match.dire_score):
+			match.radiant_score, match.dire_score = score
+			events.append(SCORE_CHANGED)
+		return events
+
+	async def make_request(self, endpoint, matchid = None, **params):
+		if matchid is not None:
+			params["match_id"] = matchid
+		method = endpoint.split("/")[1]
+		self.api_requests.inc(method = method)
+		try:
+			return await self.api.request(endpoint, **params)
+		except SteamAPIError as err:
+			self.api_errors.inc(method = method, status = err.status or "none")
+			if self.settings["verbose"]:
+				print(err)
+			if err.status == 403:
+				print("The API key provided in data/settings.json was not accepted. Please make sure it is valid.")
+			raise
+
+	def load_state(self):
+		# Picks up where the tracker left off before a restart. Matches that finished in the meantime drop out of the live listing on the first poll, and their results are published as usual.
+		try:
+			state = load_json(MATCH_STATE_FILE)
+			for matchid in state["finished"]:
+				self.finished_ids[matchid] = True
+			for match in state["matches"]:
+				if match["matchid"] not in self.finished_ids:
+					self.matches.append(**match)
+			self.series.load(state.get("series", []))
+		except FileNotFoundError:
+			return
+		except (ValueError, KeyError, TypeError):
+			print("Could not load %s. Matches tracked before the restart have been forgotten." % MATCH_STATE_FILE)
+			self.finished_ids.clear()
+			self.matches.clear()
+			self.series.load([])
+			return
+
+		self.saved_state = self.get_state()
+		if self.settings["verbose"]:
+			print("Loaded %s tracked matches from %s" % (len(self.matches), MATCH_STATE_FILE))
+
+	def get_state(self):
+		return {"matches": [match.to_dict() for match in self.matches], "finished": list(self.finished_ids), "series": self.series.to_list()}
+
+	async def save_state(self):
+		state = self.get_state()
+		if state == self.saved_state:
+			return
+
+		try:
+			await self.loop.run_in_executor(None, save_json, MATCH_STATE_FILE, state)
+			self.saved_state = state
+		except OSError as err:
+			print("Unable to save tracked matches: %s" % err)
+
+	def mark_finished(self, matchid):
+		self.finished_ids[matchid] = True
+		while len(self.finished_ids) > FINISHED_HISTORY:
+			self.finished_ids.popitem(last = False)
+
+	def is_result_due(self, matchid, current_time):
+		# Whether to ask for the details of a match that has disappeared. Until RESULT_WAIT has passed, the details cache keeps the requests to one every details_retry_interval.
+		vanished, due = self.vanished[matchid]
+		if current_time - vanished < RESULT_WAIT:
+			return True
+		if current_time < due:
+			return False
+		if self.settings["verbose"] and due - vanished < RESULT_WAIT:
+			print("[%s] Match %s has had no result for %s seconds, so it will only be checked every %s seconds" % (current_time, matchid, int(current_time - vanished), STALE_RETRY_INTERVAL))
+		self.vanished[matchid][1] = current_time + STALE_RETRY_INTERVAL
+		return True
+
+	async def fetch_match_details(self, matchids):
+		# Fetches details for several matches at once, no more than detail_concurrency at a time, answering from the cache where possible. The results are in the same order as matchids, with None for any match whose details could not be obtained.
+		semaphore = asyncio.Semaphore(self.settings["detail_concurrency"])
+
+		async def fetch(matchid):
+			details = self.details_cache.get(matchid)
+			if details is not None:
+				return details
+
+			async with semaphore:
+				try:
+					postgame = await self.make_request(MATCH_DETAILS, matchid = matchid)
+					details = json.loads(postgame)["result"]
+				except (SteamAPIError, JSONDecodeError, KeyError):
+					return None
+
+			self.details_cache.put(matchid, details)
+			return details
+
+		return await asyncio.gather(*[fetch(matchid) for matchid in matchids])
+
+	async def run(self):
+		metadata_task = self.loop.create_task(self.metadata.run())
+		try:
+			while True:
+				await self.scheduler.wait()
+				try:
+					await self.poll()
+				except asyncio.CancelledError:
+					raise
+				except Exception:
+					# A poll that goes wrong in some unforeseen way should not stop the tracking for good
+					print("Unable to poll Valve's API:")
+					traceback.print_exc()
+		finally:
+			metadata_task.cancel()
+
+	async def poll(self):
+		try:
+			with self.stage_seconds.time(stage = "fetch"):
+				response = await self.make_request(LIVE_LEAGUE_GAMES)
+		except SteamAPIError:
+			return # Just try again next time
+
+		current_time = time.time()
+
+		# Games outside the notable leagues are dropped as soon as the listing is decoded
+		leagues = set(self.settings["notable_leagues"]) if self.settings["filter_matches"] else None
+		try:
+			with self.stage_seconds.time(stage = "parse"):
+				games = parse_live_league_games(response, leagues)
+		except ValueError:
+			return
+
+		with self.stage_seconds.time(stage = "filter"):
+			live_games = OrderedDict()
+			ending = False
+			for game in games:
+				generic_ok = not self.settings["filter_generic"] or "radiant_team" in game or "dire_team" in game
+				if generic_ok and game["match_id"] > 0 and game["match_id"] not in self.finished_ids: # Valve's API occasionally gives us the dreaded "Match 0"
+					live_games[game["match_id"]] = game
+					if "scoreboard" in game and game["scoreboard"].get("duration", 0) >= NEAR_END_DURATION:
+						ending = True
+
+		with self.stage_seconds.time(stage = "diff"):
+			diff = diff_snapshots(self.matches.get_states(), OrderedDict((matchid, get_game_state(game)) for matchid, game in live_games.items()))
+
+		for matchid in diff.started:
+			game = live_games[matchid]
+			radiant_name, dire_name = get_names_from_league_game(game, self.metadata.get_team_name)
+			gameno = game["radiant_series_wins"] + game["dire_series_wins"] + 1
+
+			if self.settings["verbose"]:
+				try:
+					print("[%s] Adding match %s to list (%s vs. %s, Game %s)" % (current_time, matchid, radiant_name, dire_name, gameno))
+				except UnicodeEncodeError:
+					print("A new match has been added to the list, but could not be displayed here due to an encoding error")
+
+			radiant_id = game.get("radiant_team", {}).get("team_id")
+			dire_id = game.get("dire_team", {}).get("team_id")
+			self.metadata.learn_team(radiant_id, game.get("radiant_team", {}).get("team_name"))
+			self.metadata.learn_team(dire_id, game.get("dire_team", {}).get("team_name"))
+			seen_before = self.matches.match_exists_with_details(radiant_name, dire_name, gameno)
+			self.matches.append(matchid, radiant_name, dire_name, gameno, game["series_type"], radiant_wins = game["radiant_series_wins"], dire_wins = game["dire_series_wins"],
+				league_id = game.get("league_id"), radiant_id = radiant_id, dire_id = dire_id)
+			match = self.matches.get_match_by_id(matchid)
+
+			# A lobby hosted again for a game of a series that already has one is a duplicate. Matches between teams without IDs can only be told apart by name.
+			key = match.series_key
+			if key is not None:
+				duplicate = not self.series.claim(key, gameno, matchid, {radiant_id: match.radiant_wins, dire_id: match.dire_wins}, current_time)
+			else:
+				duplicate = seen_before
+			# This condition is needed to eliminate "duplicate" matches if the no_repeat_matches setting is enabled
+			match.announced = not (self.settings["no_repeat_matches"] and duplicate)
+			events = [MATCH_STARTED] + self.advance(match, game, diff.transitions.get(matchid))
+			if is_series_point(match.seriestype, match.radiant_wins, match.dire_wins):
+				events.append(SERIES_POINT)
+			if not match.announced:
+				events = [MATCH_STARTED]
+			with self.stage_seconds.time(stage = "announce"):
+				for kind in events:
+					event = {"type": kind, "match": match.to_dict()}
+					if kind == MATCH_STARTED:
+						event["announce"] = match.announced
+					await self.publish(event)
+
+		for matchid in diff.continuing:
+			match = self.matches.get_match_by_id(matchid)
+			if match is None:
+				continue
+			events = self.advance(match, live_games[matchid], diff.transitions.get(matchid))
+			if GAME_STARTED in events and self.settings["verbose"]:
+				print("[%s] Match %s has left the draft" % (current_time, matchid))
+			if not match.announced:
+				continue
+			for kind in events:
+				await self.publish({"type": kind, "match": match.to_dict()})
+
+		for matchid in diff.finished:
+			match = self.matches.get_match_by_id(matchid)
+			if match is not None:
+				match.state = DISAPPEARED
+				self.vanished.setdefault(matchid, [current_time, current_time])
+		# Forget about matches that have finished, been untracked or come back
+		for matchid in list(self.vanished):
+			match = self.matches.get_match_by_id(matchid)
+			if match is None or match.state != DISAPPEARED:
+				del self.vanished[matchid]
+
+		# Matches that were untracked or purged as duplicates while the events above were published are gone already, and stale ones are only asked about every so often
+		finished_matches = [match for match in map(self.matches.get_match_by_id, diff.finished) if match is not None and self.is_result_due(match.matchid, current_time)]
+		with self.stage_seconds.time(stage = "details"):
+			details = await self.fetch_match_details([finished.matchid for finished in finished_matches])
+		for finished, game in zip(finished_matches, details):
+			# Skip matches we could not get details for, and matches that were untracked or purged as duplicates while we were waiting
+			if game is None or finished.matchid not in self.matches:
+				continue
+
+			# It seems that sometimes the match disappears from the GetLiveLeagueGames listing, but hasn't actually ended yet. I don't know why...
+			if not is_match_complete(game):
+				if current_time - self.vanished[finished.matchid][0] < RESULT_WAIT:
+					ending = True # Its result should turn up soon
+				continue
+
+			if self.settings["verbose"]:
+				radiant_name, dire_name = get_names_from_match_details(game)
+
+				try:
+					print("[%s] Match %s (%s vs. %s) finished" % (current_time, finished.matchid, radiant_name, dire_name))
+				except UnicodeEncodeError:
+					print("A match has finished, but could not be displayed here due to an encoding error")
+
+			duplicates = self.matches.purge_duplicates(finished.matchid)
+			for duplicate in duplicates:
+				self.mark_finished(duplicate)
+			self.matches.remove(finished.matchid)
+			self.mark_finished(finished.matchid)
+			result = {field: game[field] for field in RESULT_FIELDS if field in game}
+			event = {"type": MATCH_FINISHED, "match": finished.to_dict(), "result": result, "duplicates": duplicates}
+			key = finished.series_key
+			if key is not None:
+				series = self.series.record_result(key, finished.matchid, finished.radiant_id if game["radiant_win"] else finished.dire_id, current_time)
+				if series is not None:
+					event["series"] = series.to_dict()
+			with self.stage_seconds.time(stage = "announce"):
+				await self.publish(event)
+
+		self.series.expire(current_time)
+		self.scheduler.update(len(self.matches) > 0, ending)
+		self.tracked_matches.set(len(self.matches))
+		await self.save_state()
+		if self.metadata.dirty:
+			await self.metadata.save()
@@ -0,0 +1,102 @@
+import json
+import os
+import unittest
+from collections import OrderedDict
+
+from cogs.utils.livegames import DRAFT, IN_PROGRESS, DISAPPEARED, get_game_state, diff_snapshots, parse_live_league_games
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def load_fixture(name):
+	# GetLiveLeagueGames responses, laid out the way Valve sends them
+	with open(os.path.join(FIXTURES, name), encoding = "utf-8") as fixture:
+		return fixture.read()
+
+def get_states(games):
+	return OrderedDict((game["match_id"], get_game_state(game)) for game in games)
+
+class ParseLiveLeagueGamesTest(unittest.TestCase):
+	def setUp(self):
+		self.draft = load_fixture("live_league_games_draft.json")
+		self.progress = load_fixture("live_league_games_progress.json")
+
+	def test_without_leagues_returns_every_game(self):
+		self.assertEqual(parse_live_league_games(self.draft), json.loads(self.draft)["result"]["games"])
+
+	def test_keeps_only_games_from_given_leagues(self):
+		games = parse_live_league_games(self.draft, {5401})
+		self.assertEqual([game["match_id"] for game in games], [3453601201, 3453601203])
+		self.assertEqual(games[1]["radiant_team"]["team_name"], "Evil Geniuses")
+
+	def test_skips_games_with_brackets_and_quotes_in_strings(self):
+		# The other league's game has a team and a player whose names look like JSON
+		games = parse_live_league_games(self.draft, {4122})
+		self.assertEqual([game["match_id"] for game in games], [3453601202])
+		self.assertEqual(games[0]["players"][0]["name"], '}{ bracket "quote" [name]')
+
+	def test_keeps_games_after_a_skipped_one(self):
+		games = parse_live_league_games(self.progress, {5401})
+		self.assertEqual([game["match_id"] for game in games], [3453601201, 3453601204])
+		self.assertNotIn("radiant_team", games[1])
+
+	def test_no_game_from_given_leagues(self):
+		self.assertEqual(parse_live_league_games(self.draft, {1}), [])
+		self.assertEqual(parse_live_league_games(self.draft, set()), [])
+
+	def test_empty_listing(self):
+		self.assertEqual(parse_live_league_games('{"result": {"games": [], "status": 200}}', {5401}), [])
+
+	def test_malformed_listing(self):
+		with self.assertRaises(ValueError):
+			parse_live_league_games('{"result": {"status": 200}}')
+		with self.assertRaises(ValueError):
+			parse_live_league_games(self.draft[:len(self.draft) // 2], {5401, 4122})
+
+class GameStateTest(unittest.TestCase):
+	def test_states(self):
+		games = parse_live_league_games(load_fixture("live_league_games_progress.json"))
+		self.assertEqual(list(get_states(games).values()), [IN_PROGRESS, IN_PROGRESS, DRAFT])
+
+class DiffSnapshotsTest(unittest.TestCase):
+	def setUp(self):
+		self.draft = get_states(parse_live_league_games(load_fixture("live_league_games_draft.json"), {5401}))
+		self.progress = get_states(parse_live_league_games(load_fixture("live_league_games_progress.json"), {5401}))
+
+	def test_first_snapshot_starts_everything(self):
+		diff = diff_snapshots(OrderedDict(), self.draft)
+		self.assertEqual(diff.started, [3453601201, 3453601203])
+		self.assertEqual(diff.continuing, [])
+		self.assertEqual(diff.finished, [])
+		self.assertEqual(diff.transitions, OrderedDict([(3453601201, (None, DRAFT)), (3453601203, (None, IN_PROGRESS))]))
+
+	def test_started_continuing_and_finished(self):
+		diff = diff_snapshots(self.draft, self.progress)
+		self.assertEqual(diff.started, [3453601204])
+		self.assertEqual(diff.continuing, [3453601201])
+		self.assertEqual(diff.finished, [3453601203])
+		self.assertEqual(diff.transitions, OrderedDict([(3453601201, (DRAFT, IN_PROGRESS)), (3453601204, (None, DRAFT)), (3453601203, (IN_PROGRESS, DISAPPEARED))]))
+
+	def test_unchanged_snapshot(self):
+		diff = diff_snapshots(self.progress, self.progress)
+		self.assertFalse(diff)
+		self.assertEqual(diff.continuing, [3453601201, 3453601204])
+
+	def test_disappeared_match_is_finished_again_without_a_transition(self):
+		# The tracker marks finished matches as disappeared, and keeps them until GetMatchDetails has their result
+		previous = OrderedDict(self.draft)
+		previous[3453601203] = DISAPPEARED
+		diff = diff_snapshots(previous, OrderedDict((matchid, state) for matchid, state in self.draft.items() if matchid != 3453601203))
+		self.assertEqual(diff.finished, [3453601203])
+		self.assertNotIn(3453601203, diff.transitions)
+		self.assertFalse(diff.started)
+
+	def test_disappeared_match_that_comes_back(self):
+		previous = OrderedDict(self.draft)
+		previous[3453601203] = DISAPPEARED
+		diff = diff_snapshots(previous, self.draft)
+		self.assertEqual(diff.continuing, [3453601201, 3453601203])
+		self.assertEqual(diff.finished, [])
+		self.assertEqual(diff.transitions, OrderedDict([(3453601203, (DISAPPEARED, IN_PROGRESS))]))
+
+if __name__ == "__main__":
+	unittest.main()
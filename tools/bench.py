@@ -0,0 +1,230 @@
+# Benchmarks for the hot paths of the Dota cog, using synthetic data instead of Discord and Steam
+# Usage: python tools/bench.py [--quick] [--only poll] [--save baseline.json] [--compare baseline.json]
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.dota import Dota
+from cogs.utils.capture import ReplaySteamAPI, ReplayScheduler
+from cogs.utils.dataIO import save_json, load_json
+from cogs.utils.livegames import parse_live_league_games
+from cogs.utils.render import MATCH_START, VICTORY_WITH_RESULT
+from cogs.utils.steamapi import LIVE_LEAGUE_GAMES, MATCH_DETAILS
+from cogs.utils.tracker import Match, MatchList
+from tools.fakes import FakeBot
+
+NOTABLE_LEAGUE = 5401
+NOTABLE_SHARE = 0.1 # Share of synthetic games that are in a notable league
+POLLS = 20
+
+BENCHMARKS = OrderedDict()
+
+def benchmark(name, sizes, quick_sizes):
+	# Registers a function that takes a size and returns (list of durations in seconds, operations per duration)
+	def register(func):
+		BENCHMARKS[name] = (func, sizes, quick_sizes)
+		return func
+	return register
+
+def make_game(matchid, league, duration, rng):
+	players = [{"account_id": rng.randrange(10 ** 8), "name": "Player %s" % i, "hero_id": rng.randrange(1, 120), "team": i // 5} for i in range(10)]
+	side = lambda: {"score": rng.randrange(40), "tower_state": 2047, "barracks_state": 63,
+		"players": [{"player_slot": i, "hero_id": rng.randrange(1, 120), "kills": rng.randrange(10), "death": rng.randrange(10), "gold": rng.randrange(10000)} for i in range(5)]}
+	return {"players": players, "radiant_team": {"team_name": "Team %s" % (matchid * 2), "team_id": matchid * 2}, "dire_team": {"team_name": "Team %s" % (matchid * 2 + 1), "team_id": matchid * 2 + 1},
+		"lobby_id": matchid * 7, "match_id": matchid, "spectators": rng.randrange(10000), "league_id": league, "stream_delay_s": 120,
+		"radiant_series_wins": 0, "dire_series_wins": 0, "series_type": 1, "scoreboard": {"duration": duration, "radiant": side(), "dire": side()}}
+
+def make_listing(live, start, rng):
+	# A GetLiveLeagueGames response with the given number of live games, numbered from start
+	games = []
+	for matchid in range(start, start + live):
+		league = NOTABLE_LEAGUE if rng.random() < NOTABLE_SHARE else rng.randrange(1, 5000)
+		games.append(make_game(matchid, league, rng.randrange(0, 3000), rng))
+	return json.dumps({"result": {"games": games, "status": 200}})
+
+def make_records(live, polls, rng):
+	# Captured responses for a run of polls in which a tenth of the games finish and are replaced every poll
+	records = []
+	turnover = max(1, live // 10)
+	for poll in range(polls):
+		start = 1 + poll * turnover
+		records.append({"time": poll * 20, "endpoint": LIVE_LEAGUE_GAMES, "params": {}, "status": 200, "body": make_listing(live, start, rng)})
+		for matchid in range(start - turnover, start):
+			details = {"result": {"match_id": matchid, "radiant_win": matchid % 2 == 0, "duration": 2400, "radiant_score": 30, "dire_score": 25}}
+			records.append({"time": poll * 20 + 1, "endpoint": MATCH_DETAILS, "params": {"match_id": matchid}, "status": 200, "body": json.dumps(details)})
+	return records
+
+def make_cog(loop, servers = 10):
+	bot = FakeBot(loop, {"verbose": False, "save_match_data": False, "notable_leagues": [NOTABLE_LEAGUE]}, servers = servers)
+	dota = Dota(bot)
+	dota.outbox.path = os.path.abspath("outbox-%s.json" % len(os.listdir("."))) # Outboxes left over from earlier runs may still be saving
+	bot.ongoing_matches = dota.tracker.matches
+	dota.tracker.listeners.append(dota.handle_event)
+	dota.rebuild_subscriptions()
+	return bot, dota
+
+@benchmark("matchlist", [10, 100, 1000], [10, 100])
+def bench_matchlist(size):
+	matches = MatchList()
+	for matchid in range(size):
+		matches.append(matchid, "Team %s" % (matchid // 2), "Team %s" % (matchid // 2 + 1), 1 + matchid % 3, 1)
+
+	durations = []
+	for _ in range(20):
+		started = time.perf_counter()
+		for match in list(matches):
+			matchid = match.matchid
+			if matchid in matches and matches.get_match_by_id(matchid) is not None:
+				matches.match_exists_with_details(match.radiant_team, match.dire_team, match.gameno)
+				matches.remove(matchid)
+				matches.append(matchid, match.radiant_team, match.dire_team, match.gameno, match.seriestype)
+		durations.append(time.perf_counter() - started)
+	return durations, size * 5
+
+@benchmark("parse", [10, 100, 1000], [10, 100])
+def bench_parse(size):
+	listing = make_listing(size, 1, random.Random(size))
+	durations = []
+	for _ in range(20):
+		started = time.perf_counter()
+		parse_live_league_games(listing, {NOTABLE_LEAGUE})
+		durations.append(time.perf_counter() - started)
+	return durations, size
+
+class TimedReplaySteamAPI(ReplaySteamAPI):
+	# Notes when each listing is requested, so that the time taken by each poll can be worked out
+
+	def __init__(self, records, loop):
+		super().__init__(records)
+		self.loop = loop
+		self.poll_times = []
+
+	async def request(self, endpoint, **params):
+		if endpoint == LIVE_LEAGUE_GAMES:
+			self.poll_times.append(time.perf_counter())
+		return await super().request(endpoint, **params)
+
+@benchmark("poll", [10, 100, 1000], [10, 100])
+def bench_poll(size):
+	loop = asyncio.get_event_loop()
+	bot, dota = make_cog(loop)
+	tracker = dota.tracker
+	tracker.api = TimedReplaySteamAPI(make_records(size, POLLS, random.Random(size)), loop)
+	tracker.scheduler = ReplayScheduler(tracker.api, 0, loop = loop)
+
+	async def run():
+		poll_task = loop.create_task(dota.track_matches())
+		await tracker.api.exhausted.wait()
+		bot.is_closed = True
+		poll_task.cancel()
+		dota.outbox.stop()
+
+	loop.run_until_complete(run())
+	times = tracker.api.poll_times
+	return [later - earlier for earlier, later in zip(times, times[1:])], 1
+
+@benchmark("fanout", [10, 1000, 10000], [10, 1000])
+def bench_fanout(size):
+	loop = asyncio.get_event_loop()
+	bot, dota = make_cog(loop, servers = size)
+
+	async def run():
+		started = time.perf_counter()
+		outcomes = await dota.announce({MATCH_START: "The draft for Team 1 vs. Team 2 is now underway (Game 1 of 3)."})
+		await asyncio.gather(*outcomes.values())
+		return time.perf_counter() - started
+
+	durations = [loop.run_until_complete(run()) for _ in range(3)]
+	dota.outbox.stop()
+	return durations, size
+
+@benchmark("results", [1], [1])
+def bench_results(size):
+	loop = asyncio.get_event_loop()
+	bot, dota = make_cog(loop)
+	messages = []
+
+	async def collect(variants):
+		messages.append(variants[VICTORY_WITH_RESULT])
+
+	dota.announce = collect
+	matches = [Match(matchid, "Team A", "Team B", 2, 1) for matchid in range(100)]
+	games = [{"match_id": matchid, "radiant_win": matchid % 2 == 0, "duration": 1800 + matchid, "radiant_score": 30, "dire_score": 25} for matchid in range(100)]
+
+	async def run():
+		started = time.perf_counter()
+		for match, game in zip(matches, games):
+			await dota.show_match_results(match, game)
+		return time.perf_counter() - started
+
+	return [loop.run_until_complete(run()) for _ in range(20)], len(games)
+
+def percentile(values, share):
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+def measure(func, size):
+	durations, ops = func(size)
+	mean = sum(durations) / len(durations)
+
+	# Allocations are measured on a separate run, as tracing them slows everything down
+	tracemalloc.start()
+	func(size)
+	current, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	return OrderedDict([("ops_per_sec", ops / mean if mean > 0 else float("inf")), ("mean_ms", mean * 1000),
+		("p50_ms", percentile(durations, 0.5) * 1000), ("p95_ms", percentile(durations, 0.95) * 1000), ("peak_kib", peak / 1024)])
+
+def main():
+	parser = argparse.ArgumentParser(description = "Benchmark the hot paths of the Dota cog.")
+	parser.add_argument("--quick", action = "store_true", help = "skip the largest sizes")
+	parser.add_argument("--only", action = "append", choices = list(BENCHMARKS), help = "run only the given benchmark (can be repeated)")
+	parser.add_argument("--save", help = "save the results to a file, to compare against later")
+	parser.add_argument("--compare", help = "compare the results with ones saved earlier")
+	parser.add_argument("--threshold", type = float, default = 10, help = "percentage by which the mean may grow before it counts as a regression")
+	args = parser.parse_args()
+
+	save_path = os.path.abspath(args.save) if args.save else None
+	baseline = load_json(os.path.abspath(args.compare)) if args.compare else {}
+
+	# Work in a scratch directory, as the cog saves its state and outbox as it goes
+	os.chdir(tempfile.mkdtemp(prefix = "bench"))
+
+	results = OrderedDict()
+	regressions = []
+	print("%-16s %12s %10s %10s %10s %10s %9s" % ("benchmark", "ops/s", "mean ms", "p50 ms", "p95 ms", "peak KiB", "vs base"))
+	for name, (func, sizes, quick_sizes) in BENCHMARKS.items():
+		if args.only and name not in args.only:
+			continue
+		for size in (quick_sizes if args.quick else sizes):
+			key = "%s/%s" % (name, size)
+			result = results[key] = measure(func, size)
+
+			change = ""
+			if key in baseline:
+				growth = (result["mean_ms"] / baseline[key]["mean_ms"] - 1) * 100
+				change = "%+.1f%%" % growth
+				if growth > args.threshold:
+					regressions.append(key)
+			print("%-16s %12.0f %10.3f %10.3f %10.3f %10.1f %9s" % (key, result["ops_per_sec"], result["mean_ms"], result["p50_ms"], result["p95_ms"], result["peak_kib"], change))
+
+	if save_path:
+		save_json(save_path, results)
+	if regressions:
+		print()
+		print("Slower than the baseline by more than %s%%: %s" % (args.threshold, ", ".join(regressions)))
+		raise SystemExit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,73 @@
+# Stand-ins for the parts of discord.py that the cogs use, so that they can be driven without connecting to Discord
+
+import asyncio
+import copy
+
+from cogs.utils.metrics import Registry
+from cogs.utils.settings import BOT_DEFAULTS, SERVER_DEFAULTS
+
+class FakeChannel:
+	def __init__(self, channelid, server):
+		self.id = channelid
+		self.server = server
+		self.name = "matches"
+		self.mention = "<#%s>" % channelid
+
+class FakeServer:
+	def __init__(self, serverid):
+		self.id = serverid
+		self.name = "Server %s" % serverid
+		self.channels = []
+
+class FakeBot:
+	"""Just enough of Bot for the Dota cog to poll, track matches and announce them
+
+	Every server gets a matches channel, unless subscribed is lower than 1, in which case only that fraction of servers do. Sent messages are kept in sent as (loop time, channel ID, content) tuples."""
+
+	def __init__(self, loop, settings = None, servers = 10, subscribed = 1.0, send_latency = 0):
+		self.loop = loop
+		self.settings = copy.deepcopy(BOT_DEFAULTS)
+		self.settings["apikey"] = "replay"
+		self.settings.update(settings or {})
+		self.server_settings_list = {}
+		self.servers = []
+		self.channels = {}
+		self.sent = []
+		self.send_latency = send_latency
+		self.is_closed = False
+		self.shard_id = None
+		self.metrics = Registry()
+
+		subscribers = int(servers * subscribed)
+		for i in range(servers):
+			server = FakeServer(str(100000 + i))
+			self.servers.append(server)
+			self.server_settings_list[server.id] = dict(SERVER_DEFAULTS)
+			if i < subscribers:
+				channel = FakeChannel(str(200000 + i), server)
+				server.channels.append(channel)
+				self.channels[channel.id] = channel
+				self.server_settings_list[server.id]["matches_channel"] = channel.id
+
+	def get_apikey(self):
+		return self.settings["apikey"]
+
+	def get_api_interval(self):
+		return self.settings["api_interval"]
+
+	def get_notable_leagues(self):
+		return self.settings["notable_leagues"]
+
+	def get_channel(self, channelid):
+		return self.channels.get(channelid)
+
+	def dispatch(self, event, *args, **kwargs):
+		pass
+
+	async def wait_until_ready(self):
+		pass
+
+	async def send_message(self, destination, content = None, **kwargs):
+		if self.send_latency:
+			await asyncio.sleep(self.send_latency)
+		self.sent.append((self.loop.time(), destination.id, content))
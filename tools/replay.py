@@ -0,0 +1,89 @@
+# Replays captured responses from Valve's API through the Dota cog, without Discord or Steam
+# Usage: python tools/replay.py data/captures/capture-20171020.jsonl.gz [more captures...] [--speed 60]
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.dota import Dota
+from cogs.utils.capture import read_capture, ReplaySteamAPI, ReplayScheduler
+from cogs.utils.dataIO import load_json
+from tools.fakes import FakeBot
+
+def load_records(paths):
+	records = []
+	for path in paths:
+		records.extend(read_capture(path))
+	records.sort(key = lambda record: record["time"])
+	return records
+
+def make_replay(loop, records, speed = 0, servers = 10, settings = None):
+	# Returns a Dota cog wired up to a FakeBot and a ReplaySteamAPI. A speed of 0 replays without waiting between polls.
+	settings = dict(settings or {})
+	settings["save_match_data"] = False
+	bot = FakeBot(loop, settings, servers = servers)
+	if speed > 0:
+		bot.settings["details_retry_interval"] /= speed
+
+	dota = Dota(bot)
+	bot.ongoing_matches = dota.tracker.matches
+	dota.tracker.listeners.append(dota.handle_event)
+	dota.tracker.api = ReplaySteamAPI(records)
+	dota.tracker.scheduler = ReplayScheduler(dota.tracker.api, speed, loop = loop)
+	return bot, dota
+
+async def run_replay(bot, dota):
+	dota.rebuild_subscriptions()
+	poll_task = bot.loop.create_task(dota.track_matches())
+	await dota.tracker.api.exhausted.wait()
+	while len(dota.outbox) > 0:
+		await asyncio.sleep(0.01)
+	bot.is_closed = True
+	poll_task.cancel()
+
+def main():
+	parser = argparse.ArgumentParser(description = "Replay captured API responses through the Dota cog.")
+	parser.add_argument("captures", nargs = "+", help = "capture files written with save_match_data enabled")
+	parser.add_argument("--speed", type = float, default = 60, help = "how many times faster than real time to replay (0 for as fast as possible)")
+	parser.add_argument("--servers", type = int, default = 10, help = "number of fake servers to announce to")
+	parser.add_argument("--settings", help = "settings.json to take notable_leagues and other options from")
+	parser.add_argument("--all-leagues", action = "store_true", help = "track matches from every league")
+	parser.add_argument("--quiet", action = "store_true", help = "only print the summary")
+	args = parser.parse_args()
+
+	records = load_records([os.path.abspath(path) for path in args.captures])
+	settings = load_json(os.path.abspath(args.settings)) if args.settings else {}
+	settings["verbose"] = False
+	if args.all_leagues:
+		settings["filter_matches"] = False
+
+	# Work in a scratch directory, so that the replay does not touch the real match state or outbox
+	os.chdir(tempfile.mkdtemp(prefix = "replay"))
+
+	loop = asyncio.get_event_loop()
+	bot, dota = make_replay(loop, records, args.speed, args.servers, settings)
+	started = time.perf_counter()
+	loop.run_until_complete(run_replay(bot, dota))
+	elapsed = time.perf_counter() - started
+
+	# The same announcement is sent to every server, so only show each one once
+	announcements = OrderedDict()
+	for sent_at, channelid, content in bot.sent:
+		announcements.setdefault(content, sent_at)
+	if not args.quiet:
+		for content in announcements:
+			print(content)
+
+	print()
+	print("Replayed %s polls (%s requests) in %.2f seconds" % (len(dota.tracker.api.polls), dota.tracker.api.requests, elapsed))
+	print("%s announcements, %s messages sent to %s servers" % (len(announcements), len(bot.sent), len(bot.servers)))
+	print("Details cache: %s" % dota.tracker.details_cache.get_stats())
+
+if __name__ == "__main__":
+	main()